@@ -0,0 +1,125 @@
+from datetime import datetime
+from decimal import Decimal
+from flask import jsonify, request, url_for
+from sqlalchemy import func
+from app import app, db
+from models import Product
+from catalog_cache import get_categories, catalog_version
+from page_cache import conditional
+from pagination import paginate_products, SORT_KEYS, DEFAULT_SORT
+
+# ?fields= name -> column; responses are built from the selected columns' rows, never ORM objects
+PRODUCT_FIELDS = {
+    'id': Product.id,
+    'name': Product.name,
+    'description': Product.description,
+    'price': Product.price,
+    'image_url': Product.image_url,
+    'category_id': Product.category_id,
+    'stock_quantity': Product.stock_quantity,
+    'featured': Product.featured,
+    'created_at': Product.created_at,
+    'updated_at': Product.updated_at,
+}
+DEFAULT_PRODUCT_FIELDS = ('id', 'name', 'price', 'image_url', 'category_id', 'stock_quantity')
+MAX_IDS = 100
+
+
+class ApiError(Exception):
+    """A client error, answered as ``{"error": message}`` with status 400"""
+
+
+@app.errorhandler(ApiError)
+def api_error(error):
+    return jsonify({'error': str(error)}), 400
+
+
+def _json_value(value):
+    if isinstance(value, Decimal):
+        return str(value)  # prices stay exact
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return value
+
+
+def _requested_fields():
+    names = [name.strip() for name in request.args.get('fields', '').split(',') if name.strip()]
+    if not names:
+        return list(DEFAULT_PRODUCT_FIELDS)
+    unknown = [name for name in names if name not in PRODUCT_FIELDS]
+    if unknown:
+        raise ApiError(f'Unknown fields: {", ".join(unknown)}; '
+                       f'choose from {", ".join(PRODUCT_FIELDS)}')
+    return ['id'] + [name for name in dict.fromkeys(names) if name != 'id']
+
+
+def _requested_ids():
+    try:
+        ids = list(dict.fromkeys(int(value) for value in request.args['ids'].split(',') if value.strip()))
+    except ValueError:
+        raise ApiError('ids must be a comma-separated list of product ids')
+    if len(ids) > MAX_IDS:
+        raise ApiError(f'At most {MAX_IDS} ids per request')
+    return ids
+
+
+def _serialize(rows, fields):
+    return [{name: _json_value(row._mapping[name]) for name in fields} for row in rows]
+
+
+def _products_version():
+    """The newest updated_at among the products a request can return, read from the database.
+
+    Every UPDATE of a product row, from any process and including the stock
+    UPDATEs, moves updated_at; for a batch the row count also catches deletes,
+    and for listings the catalog version catches new, deleted and moved products.
+    """
+    if 'ids' in request.args:
+        newest, count = db.session.query(func.max(Product.updated_at), func.count(Product.id))\
+                                  .filter(Product.id.in_(_requested_ids())).one()
+        return ('products', request.full_path, newest, count)
+    query = db.session.query(func.max(Product.updated_at))
+    category_id = request.args.get('category', type=int)
+    if category_id:
+        query = query.filter(Product.category_id == category_id)
+    return ('products', request.full_path, query.scalar(), catalog_version())
+
+
+@app.route('/api/products')
+@conditional(_products_version, shows_flashes=False, public=True)
+def api_products():
+    """Products as JSON: a keyset-paginated listing, or a batch by ?ids=1,2,3 in that order"""
+    fields = _requested_fields()
+
+    if 'ids' in request.args:
+        ids = _requested_ids()
+        columns = [PRODUCT_FIELDS[name].label(name) for name in fields]
+        rows = db.session.query(*columns).filter(Product.id.in_(ids)).all() if ids else []
+        by_id = {row.id: row for row in rows}
+        return jsonify({'products': _serialize([by_id[i] for i in ids if i in by_id], fields)})
+
+    sort = request.args.get('sort', DEFAULT_SORT)
+    if sort not in SORT_KEYS:
+        raise ApiError(f'sort must be one of {", ".join(SORT_KEYS)}')
+    # The cursor is built from the last row's sort key, so it is always selected
+    sort_field = SORT_KEYS[sort][0].key
+    selected = fields + ([sort_field] if sort_field not in fields else [])
+    query = db.session.query(*[PRODUCT_FIELDS[name].label(name) for name in selected])
+    category_id = request.args.get('category', type=int)
+    if category_id:
+        query = query.filter(Product.category_id == category_id)
+    page = paginate_products(query, sort=sort, cursor=request.args.get('cursor'),
+                             per_page=request.args.get('per_page', type=int))
+
+    body = {'products': _serialize(page.items, fields), 'next_cursor': page.next_cursor, 'next': None}
+    if page.has_next:
+        body['next'] = url_for('api_products', **{**request.args.to_dict(), 'cursor': page.next_cursor})
+    return jsonify(body)
+
+
+@app.route('/api/categories')
+@conditional(lambda: ('categories', catalog_version()), shows_flashes=False, public=True)
+def api_categories():
+    """All categories as JSON, from the catalog cache (whose version is kept in the database)"""
+    return jsonify({'categories': [{name: _json_value(value) for name, value in category.items()}
+                                   for category in get_categories()]})
@@ -1,9 +1,12 @@
 import os
 import logging
+import click
 from flask import Flask
 from flask_sqlalchemy import SQLAlchemy
+from flask_migrate import Migrate, upgrade
 from sqlalchemy.orm import DeclarativeBase
 from werkzeug.middleware.proxy_fix import ProxyFix
+import db_pool
 
 # Configure logging for debugging
 logging.basicConfig(level=logging.DEBUG)
@@ -12,11 +15,14 @@ class Base(DeclarativeBase):
     pass
 
 db = SQLAlchemy(model_class=Base)
+migrate = Migrate()
 
 # Create the app
 app = Flask(__name__)
 app.secret_key = os.environ.get("SESSION_SECRET", "a_default_secret_key_that_should_be_changed")
-app.wsgi_app = ProxyFix(app.wsgi_app, x_proto=1, x_host=1)
+# One proxy (the platform router) in front; X-Forwarded-For gives the client
+# address that rate limits are keyed on
+app.wsgi_app = ProxyFix(app.wsgi_app, x_for=1, x_proto=1, x_host=1)
 
 # Configure the database
 database_url = os.environ.get("DATABASE_URL")
@@ -24,42 +30,187 @@ if database_url and database_url.startswith("postgres://"):
     database_url = database_url.replace("postgres://", "postgresql://", 1)
 
 app.config["SQLALCHEMY_DATABASE_URI"] = database_url or "sqlite:///handmade_store_v2.db"
-app.config["SQLALCHEMY_ENGINE_OPTIONS"] = {
-    "pool_recycle": 300,
-    "pool_pre_ping": True,
-}
+# Pool sizing defaults to a profile per worker class (see db_pool.py); DB_POOL=null
+# hands pooling to an external pooler such as PgBouncer
+app.config["DB_POOL"] = os.environ.get("DB_POOL", "queue")
+app.config["DB_POOL_SIZE"] = int(os.environ["DB_POOL_SIZE"]) if os.environ.get("DB_POOL_SIZE") else None
+app.config["DB_MAX_OVERFLOW"] = int(os.environ["DB_MAX_OVERFLOW"]) if os.environ.get("DB_MAX_OVERFLOW") else None
+app.config["DB_POOL_TIMEOUT"] = float(os.environ.get("DB_POOL_TIMEOUT", 10))
+app.config["DB_POOL_RECYCLE"] = int(os.environ.get("DB_POOL_RECYCLE", 300))
+app.config["DB_POOL_PRE_PING"] = os.environ.get("DB_POOL_PRE_PING", "true").lower() == "true"
+app.config["SQLITE_BUSY_TIMEOUT_MS"] = int(os.environ.get("SQLITE_BUSY_TIMEOUT_MS", 5000))
+app.config["SQLALCHEMY_ENGINE_OPTIONS"] = db_pool.engine_options(app.config)
 app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
+app.config["SLOW_QUERY_THRESHOLD_MS"] = float(os.environ.get("SLOW_QUERY_THRESHOLD_MS", 100))
+# /metrics is off unless enabled, and then only answers Authorization: Bearer $METRICS_TOKEN
+app.config["METRICS_ENABLED"] = os.environ.get("METRICS_ENABLED", "false").lower() == "true"
+app.config["METRICS_TOKEN"] = os.environ.get("METRICS_TOKEN")
+app.config["CATALOG_CACHE_TTL"] = int(os.environ.get("CATALOG_CACHE_TTL", 300))
+app.config["CATALOG_CACHE_URL"] = os.environ.get("CATALOG_CACHE_URL")
+# Anonymous storefront pages are served from the cache (shared via CATALOG_CACHE_URL)
+app.config["PAGE_CACHE_ENABLED"] = os.environ.get("PAGE_CACHE_ENABLED", "true").lower() == "true"
+app.config["PAGE_CACHE_TTL"] = int(os.environ.get("PAGE_CACHE_TTL", 60))
+app.config["USER_CACHE_TTL"] = int(os.environ.get("USER_CACHE_TTL", 30))
+# Password hashes run off the event loop; existing hashes are upgraded on login
+app.config["PASSWORD_HASH_METHOD"] = os.environ.get("PASSWORD_HASH_METHOD", "pbkdf2:sha256:600000")
+app.config["PASSWORD_HASH_WORKERS"] = int(os.environ.get("PASSWORD_HASH_WORKERS", 2))
+# Login/register attempt limits; counters are per worker unless RATE_LIMIT_URL (Redis) is set
+app.config["RATE_LIMIT_ENABLED"] = os.environ.get("RATE_LIMIT_ENABLED", "true").lower() == "true"
+app.config["RATE_LIMIT_URL"] = os.environ.get("RATE_LIMIT_URL")
+# Sessions live server-side ("sql" or "redis"); the cookie only carries a signed id
+app.config["SESSION_BACKEND"] = os.environ.get("SESSION_BACKEND", "sql")
+app.config["SESSION_REDIS_URL"] = os.environ.get("SESSION_REDIS_URL")
+# Outgoing mail is sent by the background worker; without MAIL_SERVER it is
+# written to instance/mail/*.eml instead of being delivered
+app.config["MAIL_SERVER"] = os.environ.get("MAIL_SERVER")
+app.config["MAIL_PORT"] = int(os.environ.get("MAIL_PORT", 25))
+app.config["MAIL_USERNAME"] = os.environ.get("MAIL_USERNAME")
+app.config["MAIL_PASSWORD"] = os.environ.get("MAIL_PASSWORD")
+app.config["MAIL_USE_TLS"] = os.environ.get("MAIL_USE_TLS", "false").lower() == "true"
+app.config["MAIL_DEFAULT_SENDER"] = os.environ.get("MAIL_DEFAULT_SENDER", "orders@havencraft.local")
+# Local development (no DATABASE_URL) builds the schema with create_all;
+# everywhere else the schema is owned by the migrations in migrations/
+app.config["AUTO_CREATE_SCHEMA"] = os.environ.get(
+    "AUTO_CREATE_SCHEMA", "false" if database_url else "true").lower() == "true"
 
 # Initialize the app with the extension
 db.init_app(app)
+migrate.init_app(app, db)
+
+# Count queries and DB time per request (Server-Timing headers, slow query log, /metrics)
+import instrumentation
+with app.app_context():
+    instrumentation.init_app(app, db.engine)
+    db_pool.init_app(app, db.engine)
 
 # Import models and routes after app and db are created
-from models import init_sample_data
+from models import init_sample_data, ensure_wishlist_counts
+
+import session_store
+with app.app_context():
+    session_store.init_app(app, db.engine)
+
+def initialize_database(seed=True):
+    """Bring the schema up to date and optionally load the sample catalog.
 
-def initialize_database():
+    Run once per deploy (``flask init-db``, the Procfile release phase),
+    never from worker startup.
+    """
     with app.app_context():
-        # Create all tables
-        print("Creating database tables...")
-        db.create_all()
-        print("Database tables created successfully!")
-        
-        # Initialize sample data if database is empty
-        try:
-            if not db.session.query(db.exists().select_from(db.metadata.tables['product'])).scalar():
-                print("Initializing sample data...")
-                init_sample_data()
-                print("Sample data initialized!")
-        except Exception as e:
-            print(f"Error initializing sample data: {str(e)}")
-            import traceback
-            traceback.print_exc()
+        if app.config["AUTO_CREATE_SCHEMA"]:
+            # Create all tables (development only)
+            print("Creating database tables...")
+            db.create_all()
+            print("Database tables created successfully!")
+            ensure_wishlist_counts()
+        else:
+            print("Applying database migrations...")
+            upgrade()
+            print("Database schema is up to date!")
+
+        # Create or backfill the product full-text search index
+        from search import ensure_search_index
+        ensure_search_index()
+
+        if seed:
+            seed_sample_data()
+
+def seed_sample_data():
+    """Initialize sample data if the database is empty"""
+    try:
+        if not db.session.query(db.exists().select_from(db.metadata.tables['product'])).scalar():
+            print("Initializing sample data...")
+            init_sample_data()
+            print("Sample data initialized!")
+    except Exception as e:
+        print(f"Error initializing sample data: {str(e)}")
+        import traceback
+        traceback.print_exc()
+
+@app.cli.command("init-db")
+@click.option("--seed/--no-seed", default=True, help="Load the sample catalog into an empty database.")
+def init_db_command(seed):
+    """Create or migrate the schema and build the search index."""
+    initialize_database(seed=seed)
+
+@app.cli.command("seed")
+def seed_command():
+    """Load the sample catalog into an empty database."""
+    seed_sample_data()
+
+@app.cli.command("sweep-carts")
+@click.option("--days", default=30, show_default=True, help="Remove anonymous carts idle this long.")
+def sweep_carts_command(days):
+    """Delete abandoned anonymous carts."""
+    from cart_service import sweep_abandoned_carts
+    print(f"Removed {sweep_abandoned_carts(days)} abandoned carts")
+
+@app.cli.command("seed-synthetic")
+@click.option("--products", default=100000, type=click.IntRange(min=0), show_default=True)
+@click.option("--users", default=10000, type=click.IntRange(min=0), show_default=True)
+@click.option("--orders", default=330000, type=click.IntRange(min=0), show_default=True)
+@click.option("--items-per-order", default=3, type=click.IntRange(min=1), show_default=True,
+              help="Average order lines per order.")
+@click.option("--wishlists-per-user", default=5, type=click.IntRange(min=0), show_default=True)
+@click.option("--categories", default=12, type=click.IntRange(min=1), show_default=True)
+@click.option("--seed", default=42, show_default=True, help="Random seed; the same seed gives the same data.")
+@click.option("--batch-size", default=5000, type=click.IntRange(min=1), show_default=True)
+def seed_synthetic_command(**options):
+    """Bulk-load a large synthetic catalog, users, orders and wishlists for load testing."""
+    import time
+    from seeding import seed_synthetic
+    started = time.perf_counter()
+    with db.engine.begin() as conn:
+        counts = seed_synthetic(conn, **options)
+        catalog_cache.bump_catalog_version(conn)
+    for table, count in counts.items():
+        print(f"{table}: {count} rows")
+    print(f"Seeded in {time.perf_counter() - started:.1f}s")
+
+# Cache reference data (categories, featured products), invalidated on catalog writes
+import catalog_cache
+catalog_cache.init_app(app)
+
+# Whole-page cache for anonymous visitors and {% call cached_fragment() %} blocks
+import page_cache
+page_cache.init_app(app)
+
+# Resized image variants and the srcset helpers used by the templates
+import images
+images.init_app(app)
+
+# Self-hosted front-end dependencies, bundled per page type
+import frontend
+frontend.init_app(app)
+
+# Content-hashed url_for('static') URLs, served immutable and precompressed
+import static_assets
+static_assets.init_app(app)
+
+# Background jobs (order emails, analytics, inventory sync) run in `flask worker`
+import mailer
+import jobs
+mailer.init_app(app)
+jobs.init_app(app)
+
+# Logged-in requests read the user from a short-lived per-worker cache
+import user_cache
+user_cache.init_app(app)
+
+# Password hashing on a small pool of real threads
+import passwords
+passwords.init_app(app)
+
+# Sliding-window limits on login and registration attempts
+import ratelimit
+ratelimit.init_app(app)
 
 # Import routes after models are defined
 import auth_routes
 import routes
-
-# Initialize database when app starts
-initialize_database()
+import api_routes
 
 if __name__ == "__main__":
+    # Local development convenience; deployments run `flask init-db` in the release phase
+    initialize_database()
     app.run(host="0.0.0.0", port=int(os.environ.get("PORT", 5000)))
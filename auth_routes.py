@@ -1,8 +1,11 @@
-from flask import render_template, request, session, redirect, url_for, flash, jsonify
+from flask import render_template, request, redirect, url_for, flash
 from flask_login import LoginManager, login_user, logout_user, login_required, current_user
 from app import app, db
 from models import User
-from werkzeug.security import check_password_hash
+from cart_service import merge_anonymous_cart
+from user_cache import load_principal, invalidate_user
+from passwords import needs_rehash
+from ratelimit import rate_limit, record_failure
 
 # Initialize Flask-Login
 login_manager = LoginManager()
@@ -13,9 +16,11 @@ login_manager.login_message_category = 'info'
 
 @login_manager.user_loader
 def load_user(user_id):
-    return User.query.get(int(user_id))
+    # A cached read-only snapshot; views that change the user load the row
+    return load_principal(int(user_id))
 
 @app.route('/login', methods=['GET', 'POST'])
+@rate_limit('login')
 def login():
     if current_user.is_authenticated:
         return redirect(url_for('index'))
@@ -32,18 +37,25 @@ def login():
         user = User.query.filter_by(email=email).first()
         
         if user and user.check_password(password):
+            if needs_rehash(user.password_hash):
+                # Stored before the hashing parameters last changed
+                user.set_password(password)
+                db.session.commit()
             login_user(user, remember=remember)
+            merge_anonymous_cart(user)
             next_page = request.args.get('next')
             if next_page:
                 return redirect(next_page)
             flash(f'Welcome back, {user.get_full_name()}!', 'success')
             return redirect(url_for('index'))
         else:
+            record_failure('login')
             flash('Invalid email or password', 'error')
     
     return render_template('auth/login.html')
 
 @app.route('/register', methods=['GET', 'POST'])
+@rate_limit('register')
 def register():
     if current_user.is_authenticated:
         return redirect(url_for('index'))
@@ -116,10 +128,11 @@ def profile():
 @app.route('/profile/edit', methods=['GET', 'POST'])
 @login_required
 def edit_profile():
+    user = db.session.get(User, current_user.id)
     if request.method == 'POST':
-        current_user.first_name = request.form.get('first_name')
-        current_user.last_name = request.form.get('last_name')
-        current_user.phone = request.form.get('phone')
+        user.first_name = request.form.get('first_name')
+        user.last_name = request.form.get('last_name')
+        user.phone = request.form.get('phone')
         
         # Handle password change
         current_password = request.form.get('current_password')
@@ -127,22 +140,23 @@ def edit_profile():
         confirm_password = request.form.get('confirm_password')
         
         if new_password:
-            if not current_password or not current_user.check_password(current_password):
+            if not current_password or not user.check_password(current_password):
                 flash('Current password is incorrect', 'error')
-                return render_template('auth/edit_profile.html', user=current_user)
+                return render_template('auth/edit_profile.html', user=user)
             
             if new_password != confirm_password:
                 flash('New passwords do not match', 'error')
-                return render_template('auth/edit_profile.html', user=current_user)
+                return render_template('auth/edit_profile.html', user=user)
             
             if len(new_password) < 6:
                 flash('Password must be at least 6 characters long', 'error')
-                return render_template('auth/edit_profile.html', user=current_user)
+                return render_template('auth/edit_profile.html', user=user)
             
-            current_user.set_password(new_password)
+            user.set_password(new_password)
         
         try:
             db.session.commit()
+            invalidate_user(user.id)
             flash('Profile updated successfully!', 'success')
             return redirect(url_for('user_profile'))
         except Exception as e:
@@ -150,4 +164,4 @@ def edit_profile():
             flash('An error occurred while updating your profile.', 'error')
     
     # Handle GET request
-    return render_template('auth/edit_profile.html', user=current_user)
\ No newline at end of file
+    return render_template('auth/edit_profile.html', user=user)
\ No newline at end of file
@@ -0,0 +1,95 @@
+"""
+Show query plans and timings for the storefront's hot queries, before and
+after the indexes declared in models.py (migration 0002).
+
+    python benchmarks/query_plans.py [--products 50000] [--orders 20000] [--url sqlite://]
+
+The schema is built from the models on a scratch database (in-memory SQLite
+by default), filled with synthetic rows, and every query is explained and
+timed once without the model indexes and once with them.
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import create_engine, text  # noqa: E402
+from app import db  # noqa: E402
+from seeding import seed_synthetic  # noqa: E402
+
+HOT_QUERIES = [
+    ("category page (newest)",
+     "SELECT id FROM product WHERE category_id = :category "
+     "ORDER BY created_at DESC, id DESC LIMIT 25"),
+    ("all products by price",
+     "SELECT id FROM product ORDER BY price, id LIMIT 25"),
+    ("featured strip",
+     "SELECT id FROM product WHERE featured = :featured ORDER BY id LIMIT 4"),
+    ("order history",
+     'SELECT id FROM orders WHERE user_id = :user ORDER BY created_at DESC'),
+    ("order items for an order",
+     "SELECT id FROM order_items WHERE order_id = :order"),
+    ("wishlist for a user",
+     "SELECT id FROM wishlists WHERE user_id = :user"),
+]
+
+
+def explain(conn, sql, params):
+    if conn.dialect.name == "sqlite":
+        rows = conn.execute(text(f"EXPLAIN QUERY PLAN {sql}"), params).fetchall()
+        return [row[-1] for row in rows]
+    return [row[0] for row in conn.execute(text(f"EXPLAIN {sql}"), params).fetchall()]
+
+
+def timed(conn, sql, params, repeat=50):
+    started = time.perf_counter()
+    for _ in range(repeat):
+        conn.execute(text(sql), params).fetchall()
+    return (time.perf_counter() - started) / repeat * 1000
+
+
+def report(conn, label, params):
+    print(f"\n=== {label} ===")
+    for name, sql in HOT_QUERIES:
+        plan = explain(conn, sql, params)
+        print(f"\n{name}: {timed(conn, sql, params):.3f} ms")
+        for line in plan:
+            print(f"    {line}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--products", type=int, default=50000)
+    parser.add_argument("--orders", type=int, default=20000)
+    parser.add_argument("--url", default="sqlite://", help="scratch database; it is wiped")
+    args = parser.parse_args()
+
+    engine = create_engine(args.url)
+    indexes = [index for table in db.metadata.sorted_tables for index in table.indexes]
+
+    db.metadata.drop_all(engine)
+    db.metadata.create_all(engine)
+    with engine.begin() as conn:
+        for index in indexes:
+            index.drop(conn)
+        seed_synthetic(conn, products=args.products, users=max(args.orders // 10, 1),
+                       orders=args.orders)
+    params = {"category": 3, "featured": True, "user": 1, "order": args.orders // 2}
+
+    with engine.connect() as conn:
+        report(conn, "before (primary keys and unique constraints only)", params)
+
+    with engine.begin() as conn:
+        for index in indexes:
+            index.create(conn)
+        if conn.dialect.name == "sqlite":
+            conn.execute(text("ANALYZE"))
+
+    with engine.connect() as conn:
+        report(conn, "after (model indexes)", params)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,253 @@
+import secrets
+from datetime import datetime, timedelta
+from decimal import Decimal
+from flask import g, session
+from flask_login import current_user
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import joinedload
+from app import db
+from models import Product, Cart, CartItem
+
+TAX_RATE = Decimal('0.08')
+
+
+class PricedCart:
+    """A cart resolved against the catalog and priced once"""
+
+    def __init__(self, lines, tax_rate=TAX_RATE):
+        self.lines = lines
+        self.subtotal = sum((line['subtotal'] for line in lines), Decimal('0.0'))
+        self.tax = self.subtotal * tax_rate
+        self.total = self.subtotal + self.tax
+
+    @property
+    def item_count(self):
+        return sum(line['quantity'] for line in self.lines)
+
+    def __iter__(self):
+        return iter(self.lines)
+
+    def __len__(self):
+        return len(self.lines)
+
+    def __bool__(self):
+        return bool(self.lines)
+
+
+def _remember_count(cart, count):
+    # The header badge reads this on every page, so keep it in the session
+    # instead of counting cart lines per request. Visitors without a cart or
+    # a login get no session written on their behalf.
+    if cart is None and not current_user.is_authenticated:
+        return
+    if session.get('cart_count') != count:
+        session['cart_count'] = count
+
+
+def _find_cart():
+    if current_user.is_authenticated:
+        return Cart.query.filter_by(user_id=current_user.id).first()
+    token = session.get('cart_token')
+    return Cart.query.filter_by(token=token).first() if token else None
+
+
+def get_cart(create=False):
+    """The current visitor's cart: the user's cart when logged in, otherwise the
+    anonymous cart named by the session's cart token. Memoized per request."""
+    cart = g.get('_cart')
+    if cart is None:
+        cart = _find_cart()
+        if cart is None and (create or session.get('cart')):
+            if current_user.is_authenticated:
+                cart = Cart(user_id=current_user.id)
+            else:
+                session['cart_token'] = secrets.token_urlsafe(32)
+                cart = Cart(token=session['cart_token'])
+            db.session.add(cart)
+            db.session.flush()
+        if cart is not None:
+            _adopt_session_cart(cart)
+        g._cart = cart
+    return cart
+
+
+def _adopt_session_cart(cart):
+    # Carts from before carts were persisted still live in session['cart']
+    legacy = session.pop('cart', None)
+    if legacy:
+        for product_id, quantity in _positive_lines(legacy.items()):
+            add_item(cart, int(product_id), quantity)
+        db.session.commit()
+
+
+def _positive_lines(lines):
+    # Older carts could hold zero or negative quantities; those lines are dropped
+    return [(product_id, quantity) for product_id, quantity in lines if quantity > 0]
+
+
+def add_item(cart, product_id, quantity):
+    """Atomically add ``quantity`` of a product to the cart (one UPDATE, or an INSERT for a new line)"""
+    if quantity <= 0:
+        raise ValueError(f'Quantity must be positive, got {quantity}')
+    table = CartItem.__table__
+    updated = db.session.execute(
+        table.update()
+             .where(table.c.cart_id == cart.id, table.c.product_id == product_id)
+             .values(quantity=table.c.quantity + quantity)
+    ).rowcount
+    if not updated:
+        try:
+            with db.session.begin_nested():
+                db.session.execute(table.insert().values(cart_id=cart.id, product_id=product_id,
+                                                         quantity=quantity))
+        except IntegrityError:
+            # A concurrent request inserted the line first
+            db.session.execute(
+                table.update()
+                     .where(table.c.cart_id == cart.id, table.c.product_id == product_id)
+                     .values(quantity=table.c.quantity + quantity)
+            )
+    _cart_changed(cart)
+
+
+def set_quantity(cart, product_id, quantity):
+    """Set a line's quantity; use remove_item() to drop it"""
+    if quantity <= 0:
+        raise ValueError(f'Quantity must be positive, got {quantity}')
+    table = CartItem.__table__
+    db.session.execute(
+        table.update()
+             .where(table.c.cart_id == cart.id, table.c.product_id == product_id)
+             .values(quantity=quantity)
+    )
+    _cart_changed(cart)
+
+
+def remove_item(cart, product_id):
+    table = CartItem.__table__
+    removed = db.session.execute(
+        table.delete().where(table.c.cart_id == cart.id, table.c.product_id == product_id)
+    ).rowcount
+    _cart_changed(cart)
+    return removed
+
+
+def clear_cart(cart):
+    table = CartItem.__table__
+    db.session.execute(table.delete().where(table.c.cart_id == cart.id))
+    _cart_changed(cart)
+
+
+def _cart_changed(cart):
+    cart.updated_at = datetime.utcnow()
+    # Incremented in SQL so concurrent changes are all counted
+    cart.version = Cart.version + 1
+    g.pop('_priced_cart', None)
+    g.pop('_cart_contents', None)
+    session.pop('cart_count', None)
+
+
+def cart_version():
+    """(cart id, version) of the current cart; changes whenever its lines do"""
+    cart = get_cart()
+    return (cart.id, cart.version) if cart is not None else None
+
+
+def cart_contents(cart=None):
+    """{product_id (str): quantity} for the current cart, in one indexed query"""
+    contents = g.get('_cart_contents')
+    if contents is None:
+        cart = cart if cart is not None else get_cart()
+        contents = {}
+        if cart is not None:
+            rows = db.session.query(CartItem.product_id, CartItem.quantity)\
+                             .filter(CartItem.cart_id == cart.id)\
+                             .order_by(CartItem.id).all()
+            contents = {str(product_id): quantity for product_id, quantity in rows}
+        _remember_count(cart, sum(contents.values()))
+        g._cart_contents = contents
+    return contents
+
+
+def cart_count():
+    """Number of items in the current cart, from the session when known"""
+    count = session.get('cart_count')
+    if count is None:
+        count = sum(cart_contents().values())
+    return count
+
+
+def price_cart(cart=None):
+    """Price the current cart with a single join of its lines to products
+    (and their categories, which the cart templates show).
+
+    The result is memoized on ``g`` until the cart is next changed.
+    """
+    priced = g.get('_priced_cart')
+    if priced is not None:
+        return priced
+
+    cart = cart if cart is not None else get_cart()
+    lines = []
+    if cart is not None:
+        rows = db.session.query(Product, CartItem.quantity)\
+                         .join(CartItem, CartItem.product_id == Product.id)\
+                         .options(joinedload(Product.category))\
+                         .filter(CartItem.cart_id == cart.id)\
+                         .order_by(CartItem.id).all()
+        for product, quantity in rows:
+            price = Decimal(product.price)
+            lines.append({
+                'product': product,
+                'quantity': quantity,
+                'price': price,
+                'subtotal': price * quantity
+            })
+
+    priced = PricedCart(lines)
+    _remember_count(cart, priced.item_count)
+    g._priced_cart = priced
+    return priced
+
+
+def merge_anonymous_cart(user):
+    """Fold the session's anonymous cart into ``user``'s cart (call right after login)"""
+    token = session.pop('cart_token', None)
+    legacy = session.pop('cart', None)
+    anonymous = Cart.query.filter_by(token=token).first() if token else None
+    if anonymous is None and not legacy:
+        session.pop('cart_count', None)
+        return
+
+    user_cart = Cart.query.filter_by(user_id=user.id).first()
+    if user_cart is None and anonymous is not None:
+        # Nothing to merge into: the anonymous cart simply changes owner
+        anonymous.user_id, anonymous.token = user.id, None
+        user_cart, anonymous = anonymous, None
+    elif user_cart is None:
+        user_cart = Cart(user_id=user.id)
+        db.session.add(user_cart)
+        db.session.flush()
+
+    if anonymous is not None:
+        for product_id, quantity in _positive_lines((item.product_id, item.quantity) for item in anonymous.items):
+            add_item(user_cart, product_id, quantity)
+        db.session.delete(anonymous)
+    for product_id, quantity in _positive_lines((legacy or {}).items()):
+        add_item(user_cart, int(product_id), quantity)
+
+    db.session.commit()
+    g.pop('_cart', None)
+    session.pop('cart_count', None)
+
+
+def sweep_abandoned_carts(days=30):
+    """Delete anonymous carts untouched for ``days``; returns how many were removed"""
+    cutoff = datetime.utcnow() - timedelta(days=days)
+    stale = db.session.query(Cart.id).filter(Cart.user_id.is_(None), Cart.updated_at < cutoff)
+    CartItem.query.filter(CartItem.cart_id.in_(stale.scalar_subquery()))\
+                  .delete(synchronize_session=False)
+    removed = Cart.query.filter(Cart.user_id.is_(None), Cart.updated_at < cutoff)\
+                        .delete(synchronize_session=False)
+    db.session.commit()
+    return removed
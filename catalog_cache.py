@@ -0,0 +1,191 @@
+import logging
+import pickle
+import threading
+import time
+from collections import OrderedDict
+from flask import g, has_app_context
+from sqlalchemy import event, func
+from sqlalchemy.orm import Session, object_session
+from app import db
+from models import CacheVersion, Category, Product
+
+logger = logging.getLogger(__name__)
+
+VERSION_KEY = 'catalog:version'
+
+
+class LRUCache:
+    """Thread-safe in-process LRU cache whose entries expire after ``ttl`` seconds"""
+
+    def __init__(self, maxsize=256, ttl=300):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            expires, value = entry
+            if expires < time.monotonic():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl=None):
+        with self._lock:
+            self._data[key] = (time.monotonic() + (ttl or self.ttl), value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+class RedisBackend:
+    """Shared cache backend so all workers see the same entries"""
+
+    def __init__(self, url, ttl=300):
+        try:
+            import redis
+        except ImportError:
+            raise RuntimeError('CATALOG_CACHE_URL is set but the redis package is not installed')
+        self.client = redis.Redis.from_url(url)
+        self.ttl = ttl
+
+    def get(self, key):
+        raw = self.client.get(key)
+        return pickle.loads(raw) if raw is not None else None
+
+    def set(self, key, value, ttl=None):
+        self.client.set(key, pickle.dumps(value), ex=int(ttl or self.ttl))
+
+    def delete(self, key):
+        self.client.delete(key)
+
+
+_local = LRUCache()
+_shared = None
+
+
+def init_app(app):
+    """Configure the catalog cache from CATALOG_CACHE_TTL/SIZE/URL"""
+    global _local, _shared
+    ttl = app.config.setdefault('CATALOG_CACHE_TTL', 300)
+    size = app.config.setdefault('CATALOG_CACHE_SIZE', 256)
+    url = app.config.setdefault('CATALOG_CACHE_URL', None)
+    _local = LRUCache(maxsize=size, ttl=ttl)
+    _shared = RedisBackend(url, ttl=ttl) if url else None
+
+
+def catalog_version():
+    """Current catalog version; any committed Category/Product change bumps it.
+
+    It lives in the database, so a change committed by any process (another
+    web worker, ``flask worker``, a CLI command) retires cached entries at
+    once; it is read once per request.
+    """
+    if '_catalog_version' not in g:
+        table = CacheVersion.__table__
+        g._catalog_version = db.session.execute(
+            db.select(table.c.version).where(table.c.name == VERSION_KEY)
+        ).scalar() or 0
+    return g._catalog_version
+
+
+def _increment_version(connection, key):
+    table = CacheVersion.__table__
+    updated = connection.execute(
+        table.update().where(table.c.name == key).values(version=table.c.version + 1)
+    ).rowcount
+    if not updated:
+        connection.execute(table.insert().values(name=key, version=1))
+
+
+def bump_catalog_version(connection=None):
+    """Bump the catalog version for writes the ORM events do not see (Core statements).
+
+    Pass the writing ``connection`` to bump in its transaction; otherwise the
+    bump commits on its own.
+    """
+    if connection is not None:
+        _increment_version(connection, VERSION_KEY)
+    else:
+        with db.engine.begin() as connection:
+            _increment_version(connection, VERSION_KEY)
+    if has_app_context():
+        g.pop('_catalog_version', None)
+
+
+def cached(name, loader):
+    """Return ``loader()`` cached under ``name`` for the current catalog version"""
+    key = f'catalog:{catalog_version()}:{name}'
+    value = _local.get(key)
+    if value is not None:
+        return value
+    if _shared is not None:
+        try:
+            value = _shared.get(key)
+        except Exception as e:
+            logger.warning(f'Catalog cache backend unavailable: {e}')
+    if value is None:
+        value = loader()
+        if _shared is not None:
+            try:
+                _shared.set(key, value)
+            except Exception as e:
+                logger.warning(f'Catalog cache backend unavailable: {e}')
+    _local.set(key, value)
+    return value
+
+
+def _snapshot(obj):
+    """Plain column values of a model row, safe to share between requests"""
+    return {column.key: getattr(obj, column.key) for column in obj.__table__.columns}
+
+
+def get_categories():
+    return cached('categories', lambda: [_snapshot(c) for c in Category.query.order_by(Category.id).all()])
+
+
+def get_featured_products(limit=4):
+    return cached(f'featured:{limit}', lambda: [
+        _snapshot(p) for p in Product.query.filter_by(featured=True).order_by(Product.id).limit(limit).all()
+    ])
+
+
+def get_product_count():
+    return cached('product_count', lambda: db.session.query(func.count(Product.id)).scalar())
+
+
+def _mark_catalog_changed(mapper, connection, target):
+    session = object_session(target)
+    if session is not None and not session.info.get('catalog_changed'):
+        # Once per transaction, which commits or rolls back the bump with the change
+        _increment_version(connection, VERSION_KEY)
+        session.info['catalog_changed'] = True
+
+
+for _model in (Category, Product):
+    for _event in ('after_insert', 'after_update', 'after_delete'):
+        event.listen(_model, _event, _mark_catalog_changed)
+
+
+@event.listens_for(Session, 'after_commit')
+def _invalidate_on_commit(session):
+    if session.info.pop('catalog_changed', False) and has_app_context():
+        g.pop('_catalog_version', None)
+
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_on_rollback(session):
+    session.info.pop('catalog_changed', None)
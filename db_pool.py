@@ -0,0 +1,144 @@
+import threading
+import time
+from sqlalchemy import event
+from sqlalchemy.engine import make_url
+from sqlalchemy.exc import TimeoutError as PoolTimeout
+from sqlalchemy.pool import NullPool, QueuePool
+import instrumentation
+
+try:
+    from gevent import monkey as gevent_monkey
+except ImportError:  # gevent is optional; without it the threaded profile applies
+    gevent_monkey = None
+
+# Connections per process by worker class. A gevent worker serves many requests
+# at once, so it needs more than the default 5 + 10; size DB_POOL_SIZE against
+# the server's max_connections divided by the number of worker processes.
+PROFILES = {
+    'sync': {'pool_size': 5, 'max_overflow': 10},
+    'gevent': {'pool_size': 10, 'max_overflow': 10},
+}
+
+_stats = {'checkouts': 0, 'connects': 0, 'wait_seconds': 0.0, 'timeouts': 0}
+_stats_lock = threading.Lock()
+_engine = None
+
+
+class _TimedPool:
+    """Counts checkouts and the time spent waiting for (or opening) a connection"""
+
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            return super()._do_get()
+        except PoolTimeout:
+            with _stats_lock:
+                _stats['timeouts'] += 1
+            raise
+        finally:
+            with _stats_lock:
+                _stats['checkouts'] += 1
+                _stats['wait_seconds'] += time.perf_counter() - started
+
+
+class TimedQueuePool(_TimedPool, QueuePool):
+    pass
+
+
+class TimedNullPool(_TimedPool, NullPool):
+    pass
+
+
+def worker_class():
+    """'gevent' under gunicorn's gevent workers (which patch sockets before loading the app)"""
+    if gevent_monkey is not None and gevent_monkey.is_module_patched('socket'):
+        return 'gevent'
+    return 'sync'
+
+
+def engine_options(config):
+    """SQLALCHEMY_ENGINE_OPTIONS for the database URL, the worker class and DB_POOL_* settings.
+
+    DB_POOL=null opens a connection per checkout, for use behind an external
+    pooler such as PgBouncer, which then owns pooling and health checks.
+    Any DB_POOL other than ``queue`` (the default) or ``null`` is a ValueError.
+    """
+    pool = config.get('DB_POOL', 'queue')
+    if pool not in ('queue', 'null'):
+        raise ValueError(f"DB_POOL must be 'queue' or 'null', not {pool!r}")
+    url = make_url(config['SQLALCHEMY_DATABASE_URI'])
+    if url.get_backend_name() == 'sqlite':
+        if url.database in (None, '', ':memory:'):
+            return {}  # Flask-SQLAlchemy gives in-memory databases a StaticPool
+        # A local file: no network to pre-ping or connections to recycle
+        return {'poolclass': TimedQueuePool}
+
+    if pool == 'null':
+        return {'poolclass': TimedNullPool}
+
+    profile = PROFILES[worker_class()]
+    size = config.get('DB_POOL_SIZE')
+    overflow = config.get('DB_MAX_OVERFLOW')
+    return {
+        'poolclass': TimedQueuePool,
+        'pool_size': profile['pool_size'] if size is None else size,
+        'max_overflow': profile['max_overflow'] if overflow is None else overflow,
+        'pool_timeout': config.get('DB_POOL_TIMEOUT', 10),
+        'pool_recycle': config.get('DB_POOL_RECYCLE', 300),
+        # A round trip per checkout; without it, pool_recycle retires connections
+        # before the server's idle timeout and a dropped one fails a single request
+        'pool_pre_ping': config.get('DB_POOL_PRE_PING', True),
+    }
+
+
+def _sqlite_pragmas(busy_timeout_ms):
+    def on_connect(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        # Readers no longer block the writer (and vice versa); writers queue
+        # for up to busy_timeout instead of failing with "database is locked"
+        cursor.execute('PRAGMA journal_mode=WAL')
+        cursor.execute('PRAGMA synchronous=NORMAL')
+        cursor.execute(f'PRAGMA busy_timeout={int(busy_timeout_ms)}')
+        cursor.close()
+    return on_connect
+
+
+def _count_connect(dbapi_connection, connection_record):
+    with _stats_lock:
+        _stats['connects'] += 1
+
+
+def init_app(app, engine):
+    """SQLite pragmas and pool metrics for ``engine`` (built from engine_options())"""
+    global _engine
+    _engine = engine
+    busy_timeout = app.config.setdefault('SQLITE_BUSY_TIMEOUT_MS', 5000)
+    if engine.dialect.name == 'sqlite' and engine.url.database not in (None, '', ':memory:'):
+        event.listen(engine, 'connect', _sqlite_pragmas(busy_timeout))
+    event.listen(engine, 'connect', _count_connect)
+    instrumentation.add_metrics(metric_lines)
+
+
+def metric_lines():
+    """Pool counters and gauges in the Prometheus text format (served from /metrics)"""
+    with _stats_lock:
+        stats = dict(_stats)
+    series = [
+        ('havencraft_db_pool_checkouts_total', 'counter', 'Connections checked out of the pool', stats['checkouts']),
+        ('havencraft_db_pool_wait_seconds_total', 'counter', 'Time spent waiting for a pooled connection',
+         round(stats['wait_seconds'], 6)),
+        ('havencraft_db_pool_timeouts_total', 'counter', 'Checkouts that gave up after pool_timeout',
+         stats['timeouts']),
+        ('havencraft_db_pool_connects_total', 'counter', 'New database connections opened', stats['connects']),
+    ]
+    pool = _engine.pool if _engine is not None else None
+    if isinstance(pool, QueuePool):
+        series += [
+            ('havencraft_db_pool_checked_out', 'gauge', 'Connections currently in use', pool.checkedout()),
+            ('havencraft_db_pool_size', 'gauge', 'Configured pool size', pool.size()),
+            ('havencraft_db_pool_overflow', 'gauge', 'Connections open beyond pool_size', max(pool.overflow(), 0)),
+        ]
+    lines = []
+    for name, kind, help_text, value in series:
+        lines += [f'# HELP {name} {help_text}', f'# TYPE {name} {kind}', f'{name} {value}']
+    return lines
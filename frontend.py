@@ -0,0 +1,304 @@
+import glob
+import os
+import posixpath
+import re
+import urllib.request
+from flask import current_app, url_for
+from markupsafe import Markup, escape
+
+try:
+    from fontTools import subset as font_subset
+except ImportError:  # fonttools is optional; the full icon fonts are bundled without it
+    font_subset = None
+
+try:
+    import rjsmin
+except ImportError:  # rjsmin is optional; scripts are then concatenated unminified
+    rjsmin = None
+
+BOOTSTRAP = 'https://cdn.jsdelivr.net/npm/bootstrap@5.3.2/dist'
+POPPER = 'https://cdn.jsdelivr.net/npm/@popperjs/core@2.11.8/dist/umd'
+FONT_AWESOME = 'https://cdnjs.cloudflare.com/ajax/libs/font-awesome/6.5.0'
+# fontsource's builds of the Google Fonts, one woff2 per family, weight and subset
+FONTSOURCE = 'https://cdn.jsdelivr.net/npm/@fontsource'
+GOOGLE_FONTS = 'https://fonts.googleapis.com/css2'
+
+# Upstream files copied into static/vendor by `flask vendor-assets` (and committed)
+VENDOR = {
+    'vendor/bootstrap/bootstrap.min.css': f'{BOOTSTRAP}/css/bootstrap.min.css',
+    'vendor/bootstrap/popper.min.js': f'{POPPER}/popper.min.js',
+    'vendor/bootstrap/bootstrap.min.js': f'{BOOTSTRAP}/js/bootstrap.min.js',
+    'vendor/fontawesome/css/all.min.css': f'{FONT_AWESOME}/css/all.min.css',
+    'vendor/fontawesome/webfonts/fa-solid-900.woff2': f'{FONT_AWESOME}/webfonts/fa-solid-900.woff2',
+    'vendor/fontawesome/webfonts/fa-regular-400.woff2': f'{FONT_AWESOME}/webfonts/fa-regular-400.woff2',
+    'vendor/fontawesome/webfonts/fa-brands-400.woff2': f'{FONT_AWESOME}/webfonts/fa-brands-400.woff2',
+}
+FONTS_CSS = 'vendor/fonts/fonts.css'
+FONT_FAMILIES = {'Inter': (400, 500, 600, 700), 'Playfair Display': (400, 500, 600)}
+# The unicode-range of each subset, as Google Fonts splits them
+FONT_SUBSETS = {
+    'latin': 'U+0000-00FF, U+0131, U+0152-0153, U+02BB-02BC, U+02C6, U+02DA, U+02DC, U+0304, U+0308, '
+             'U+0329, U+2000-206F, U+2074, U+20AC, U+2122, U+2191, U+2193, U+2212, U+2215, U+FEFF, U+FFFD',
+    'latin-ext': 'U+0100-02AF, U+0304, U+0308, U+0329, U+1E00-1E9F, U+1EF2-1EFF, U+2020, U+20A0-20AB, '
+                 'U+20AD-20C0, U+2113, U+2C60-2C7F, U+A720-A7FF',
+}
+
+
+def _font_files():
+    """{static filename: (family, weight, subset)} for every vendored font face"""
+    files = {}
+    for family, weights in FONT_FAMILIES.items():
+        slug = family.lower().replace(' ', '-')
+        for weight in weights:
+            for subset in FONT_SUBSETS:
+                files[f'vendor/fonts/{slug}-{subset}-{weight}.woff2'] = (family, weight, subset)
+    return files
+
+
+def _font_url(filename):
+    family, weight, subset = _font_files()[filename]
+    slug = family.lower().replace(' ', '-')
+    # The files are committed, so the major-version range only matters when re-vendoring
+    return f'{FONTSOURCE}/{slug}@5/files/{slug}-{subset}-{weight}-normal.woff2'
+
+
+def _font_fallbacks(exists):
+    """Google Fonts stylesheets for the families whose faces are not all vendored yet"""
+    files = _font_files()
+    urls = []
+    for family, weights in FONT_FAMILIES.items():
+        if all(exists(name) for name, face in files.items() if face[0] == family):
+            continue
+        # Without this, headings would silently fall back to the next font in the stack
+        urls.append(f'{GOOGLE_FONTS}?family={family.replace(" ", "+")}:wght@'
+                    f'{";".join(str(weight) for weight in weights)}&display=swap')
+    return urls
+
+# Where a page gets each source while it has not been vendored yet
+FALLBACKS = {
+    'vendor/bootstrap/bootstrap.min.css': f'{BOOTSTRAP}/css/bootstrap.min.css',
+    'vendor/bootstrap/popper.min.js': f'{POPPER}/popper.min.js',
+    'vendor/bootstrap/bootstrap.min.js': f'{BOOTSTRAP}/js/bootstrap.min.js',
+    'vendor/fontawesome/css/all.min.css': f'{FONT_AWESOME}/css/all.min.css',
+}
+
+ICONS_SOURCE = 'vendor/fontawesome/css/all.min.css'
+ICONS_SUBSET = 'vendor/fontawesome/css/icons.min.css'
+
+# One stylesheet for every page, one script per page type
+BUNDLES = {
+    'site.css': [
+        'vendor/bootstrap/bootstrap.min.css',
+        ICONS_SOURCE,
+        FONTS_CSS,
+        'css/modern-style.css',
+    ],
+    'site.js': [
+        'vendor/bootstrap/popper.min.js',
+        'vendor/bootstrap/bootstrap.min.js',
+        'js/main.js',
+        'js/cart.js',
+    ],
+}
+BUNDLES['home.js'] = BUNDLES['site.js'] + ['js/hero-slider.js']
+
+DIST = 'dist'
+
+_ICON_RULE = re.compile(r'^(?P<selectors>(?:\.fa-[a-z0-9-]+:(?:before|after),?)+)'
+                        r'\{content:"(?P<content>[^"]*)"\}$')
+_ICON_NAME = re.compile(r'fa-[a-z0-9-]+')
+_CSS_URL = re.compile(r'url\((["\']?)([^)"\']+)\1\)')
+_CSS_ESCAPE = re.compile(r'\\([0-9a-fA-F]{1,6})')
+
+_present = {}
+
+
+def _static_path(filename):
+    return os.path.join(current_app.static_folder, filename)
+
+
+def _exists(filename):
+    return os.path.isfile(_static_path(filename))
+
+
+def _present_once(filename):
+    # Outside debug mode the static folder only changes with a deploy
+    if filename not in _present:
+        _present[filename] = _exists(filename)
+    return _present[filename]
+
+
+def _read(filename):
+    with open(_static_path(filename), encoding='utf-8') as f:
+        return f.read()
+
+
+def _write(filename, data):
+    path = _static_path(filename)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'wb' if isinstance(data, bytes) else 'w') as f:
+        f.write(data)
+
+
+def _download(url):
+    with urllib.request.urlopen(url, timeout=30) as response:
+        return response.read()
+
+
+def write_fonts_css():
+    """Write the @font-face rules for the vendored fonts to FONTS_CSS"""
+    blocks = []
+    for filename, (family, weight, subset) in _font_files().items():
+        if not _exists(filename):
+            continue  # the font stacks in modern-style.css fall back to system fonts
+        blocks.append(f'/* {family} {weight} {subset} */\n'
+                      f'@font-face {{\n'
+                      f"  font-family: '{family}';\n"
+                      f'  font-style: normal;\n'
+                      f'  font-weight: {weight};\n'
+                      f'  font-display: swap;\n'
+                      f"  src: url({posixpath.basename(filename)}) format('woff2');\n"
+                      f'  unicode-range: {FONT_SUBSETS[subset]};\n'
+                      f'}}')
+    _write(FONTS_CSS, '\n'.join(blocks) + '\n')
+
+
+def vendor():
+    """Download the pinned upstream files and web fonts into static/vendor"""
+    for filename, url in list(VENDOR.items()) + [(name, _font_url(name)) for name in _font_files()]:
+        _write(filename, _download(url))
+        print(f'  {filename}')
+    write_fonts_css()
+    print(f'  {FONTS_CSS}')
+
+
+def used_icons():
+    """Every fa-* class named in the templates, scripts and Python code"""
+    root = current_app.root_path
+    names = set()
+    for pattern in ('templates/**/*.html', 'static/js/**/*.js', '*.py'):
+        for path in glob.glob(os.path.join(root, pattern), recursive=True):
+            with open(path, encoding='utf-8') as f:
+                names.update(_ICON_NAME.findall(f.read()))
+    return names
+
+
+def subset_icons():
+    """Cut Font Awesome down to the icons in use: a smaller stylesheet and, with fonttools, smaller fonts"""
+    icons = used_icons()
+    codepoints = set()
+    rules = []
+    for rule in re.split(r'(?<=\})', _read(ICONS_SOURCE)):
+        match = _ICON_RULE.match(rule.strip())
+        if match is None:
+            rules.append(rule)
+            continue
+        selectors = [s for s in match['selectors'].split(',') if s.split(':')[0][1:] in icons]
+        if selectors:
+            rules.append(f'{",".join(selectors)}{{content:"{match["content"]}"}}')
+            codepoints.update(int(code, 16) for code in _CSS_ESCAPE.findall(match['content']))
+    css = ''.join(rules)
+
+    fonts = os.path.join(current_app.static_folder, 'vendor', 'fontawesome', 'webfonts')
+    for name in ('fa-solid-900', 'fa-regular-400', 'fa-brands-400'):
+        source = os.path.join(fonts, f'{name}.woff2')
+        if font_subset is None or not os.path.exists(source):
+            continue
+        options = font_subset.Options()
+        options.flavor = 'woff2'
+        font = font_subset.load_font(source, options)
+        subsetter = font_subset.Subsetter(options)
+        subsetter.populate(unicodes=codepoints)
+        subsetter.subset(font)
+        font_subset.save_font(font, os.path.join(fonts, f'{name}.subset.woff2'), options)
+        css = css.replace(f'../webfonts/{name}.woff2', f'../webfonts/{name}.subset.woff2')
+
+    # Only the woff2 fonts are vendored; drop the truetype fallbacks and v4 shim fonts
+    css = re.sub(r',url\(\.\./webfonts/[^)]+\.ttf\) format\("truetype"\)', '', css)
+    css = re.sub(r'@font-face\{[^}]*fa-v4compatibility[^}]*\}', '', css)
+    _write(ICONS_SUBSET, css)
+    return len(icons), len(codepoints)
+
+
+def _minify_css(css):
+    # Conservative: comments (except /*! licences), then whitespace around punctuation
+    css = re.sub(r'/\*(?!!).*?\*/', '', css, flags=re.S)
+    css = re.sub(r'\s+', ' ', css)
+    css = re.sub(r'\s*([{};,>])\s*', r'\1', css)
+    return css.replace(';}', '}').strip()
+
+
+def _rebase_urls(css, source, target):
+    """Rewrite relative url()s in ``source``'s CSS so they still resolve from ``target``"""
+    def rebase(match):
+        url = match.group(2)
+        if url.startswith(('data:', 'http:', 'https:', '/', '#')):
+            return match.group(0)
+        path = posixpath.normpath(posixpath.join(posixpath.dirname(source), url))
+        if '?' not in path and '#' not in path and _exists(path):
+            # Fonts get the same immutable, fingerprinted URLs as everything else
+            from static_assets import hashed_name
+            path = hashed_name(path)
+        return f'url({posixpath.relpath(path, posixpath.dirname(target))})'
+    return _CSS_URL.sub(rebase, css)
+
+
+def build_bundles():
+    """Concatenate and minify each bundle into static/dist; returns {bundle: sources included}"""
+    built = {}
+    for name, sources in BUNDLES.items():
+        target = f'{DIST}/{name}'
+        parts, included = [], []
+        for source in sources:
+            if source == ICONS_SOURCE and _exists(ICONS_SUBSET):
+                source = ICONS_SUBSET
+            if not _exists(source):
+                continue  # not vendored yet; asset_tags links its fallback instead
+            # Source maps are not vendored
+            text = re.sub(r'\n?(?://|/\*)# sourceMappingURL=\S+(?: \*/)?', '', _read(source))
+            minified = '.min.' in source  # upstream builds are already minified
+            if name.endswith('.css'):
+                text = _rebase_urls(text, source, target)
+                parts.append(text if minified else _minify_css(text))
+            else:
+                parts.append(text if minified or rjsmin is None else rjsmin.jsmin(text, keep_bang_comments=True))
+            included.append(source)
+        _write(target, ('\n' if name.endswith('.css') else ';\n').join(parts) + '\n')
+        built[name] = included
+    return built
+
+
+def _tag(url, kind):
+    if kind == 'css':
+        return f'<link rel="stylesheet" href="{escape(url)}">'
+    return f'<script src="{escape(url)}"></script>'
+
+
+def asset_tags(bundle):
+    """<link>/<script> tags for a bundle: the built file, or its sources in debug / before a build.
+
+    Sources that have not been vendored yet are loaded from their CDN, and
+    web font families from Google Fonts.
+    """
+    kind = bundle.rsplit('.', 1)[1]
+    exists = _exists if current_app.debug else _present_once
+    # Every fallback is a library, so it goes ahead of our own code and styles
+    missing = [FALLBACKS[s] for s in BUNDLES[bundle] if s in FALLBACKS and not exists(s)]
+    if FONTS_CSS in BUNDLES[bundle]:
+        missing += _font_fallbacks(exists)
+    if exists(f'{DIST}/{bundle}') and not current_app.debug:
+        local = [url_for('static', filename=f'{DIST}/{bundle}')]
+    else:
+        local = [url_for('static', filename=s) for s in BUNDLES[bundle] if exists(s)]
+    return Markup('\n    '.join(_tag(url, kind) for url in missing + local))
+
+
+def init_app(app):
+    """Register asset_tags() for the templates and ``flask vendor-assets``"""
+    app.jinja_env.globals.update(asset_tags=asset_tags)
+
+    @app.cli.command('vendor-assets')
+    def vendor_assets_command():
+        """Download Bootstrap, Font Awesome and the web fonts into static/vendor."""
+        vendor()
+        print('Vendored front-end dependencies; commit static/vendor')
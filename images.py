@@ -0,0 +1,193 @@
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+from markupsafe import Markup, escape
+from flask import abort, redirect, send_from_directory, url_for
+from werkzeug.security import safe_join
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:  # Pillow is optional; without it pages use the original images
+    Image = None
+
+try:
+    from gevent import monkey as gevent_monkey
+    from gevent.threadpool import ThreadPool as GeventThreadPool
+except ImportError:  # gevent is optional; without it a plain thread pool runs the resizes
+    gevent_monkey = None
+
+logger = logging.getLogger(__name__)
+
+# Width buckets every variant is cut to (never upscaled past the source)
+WIDTHS = {'thumb': 160, 'card': 400, 'detail': 800, 'hero': 1600}
+
+# Per use: the buckets offered in srcset and how wide the image is laid out
+PRESETS = {
+    'thumb': ((WIDTHS['thumb'], WIDTHS['card']), '(max-width: 768px) 25vw, 120px'),
+    'card': ((WIDTHS['card'], WIDTHS['detail']),
+             '(max-width: 768px) 100vw, (max-width: 992px) 50vw, 33vw'),
+    'detail': ((WIDTHS['card'], WIDTHS['detail'], WIDTHS['hero']), '(max-width: 992px) 100vw, 50vw'),
+    'hero': ((WIDTHS['detail'], WIDTHS['hero']), '100vw'),
+}
+
+QUALITY = 80
+VARIANT_DIR = 'variants'  # under the static folder; built on demand, not committed
+
+_static_folder = None
+_static_prefix = None
+_variant_dir = None
+_known = set()
+_source_widths = {}
+_pool = None
+
+
+def _source_path(url):
+    """Filesystem path of a /static/ image URL, or None for anything else"""
+    if not url or not url.startswith(_static_prefix):
+        return None
+    return safe_join(_static_folder, url[len(_static_prefix):])
+
+
+def _variant_name(url, width):
+    stem = os.path.splitext(url[len(_static_prefix):])[0]
+    return f'{stem}-{width}w.webp'
+
+
+def _source_width(url):
+    """Pixel width of a static image (read from its header once), or None if unreadable"""
+    if url not in _source_widths:
+        try:
+            with Image.open(_source_path(url)) as image:
+                _source_widths[url] = ImageOps.exif_transpose(image).width
+        except (OSError, TypeError, ValueError):
+            _source_widths[url] = None
+    return _source_widths[url]
+
+
+def build_variant(url, width):
+    """Write the ``width`` variant of a static image if it is missing; returns its path or None"""
+    source = _source_path(url)
+    if Image is None or source is None or not os.path.isfile(source):
+        return None
+    name = _variant_name(url, width)
+    target = safe_join(_variant_dir, name)
+    if os.path.exists(target):
+        return target
+    os.makedirs(os.path.dirname(target), exist_ok=True)
+    with Image.open(source) as image:
+        image = ImageOps.exif_transpose(image)
+        if image.mode not in ('RGB', 'RGBA'):
+            image = image.convert('RGB')
+        if image.width <= width:
+            return None  # the original is already small enough
+        image = image.resize((width, round(image.height * width / image.width)),
+                             Image.Resampling.LANCZOS)
+        # Write beside the target and rename, so concurrent builders never serve half a file
+        partial = f'{target}.{os.getpid()}.tmp'
+        image.save(partial, 'WEBP', quality=QUALITY, method=6)
+    os.replace(partial, target)
+    return target
+
+
+def _build_off_loop(url, width):
+    # Resizing is CPU-bound; on a real OS thread the event loop keeps serving
+    # other requests, and Pillow releases the GIL while it resamples and encodes
+    if _pool is None:
+        return build_variant(url, width)
+    if isinstance(_pool, ThreadPoolExecutor):
+        return _pool.submit(build_variant, url, width).result()
+    return _pool.apply(build_variant, (url, width))
+
+
+def variant_url(url, width):
+    """URL of a resized variant: the static file once built, otherwise the route that builds it.
+
+    Images already no wider than ``width`` are used as they are.
+    """
+    if Image is None or _source_path(url) is None:
+        return url
+    source_width = _source_width(url)
+    if source_width is None or source_width <= width:
+        return url
+    name = _variant_name(url, width)
+    if name not in _known:
+        if not os.path.exists(os.path.join(_variant_dir, name)):
+            return url_for('image_variant', width=width, source=url[len(_static_prefix):])
+        _known.add(name)
+    return url_for('static', filename=f'{VARIANT_DIR}/{name}')
+
+
+def responsive_image(url, preset='card'):
+    """``src``, ``srcset`` and ``sizes`` attributes for an <img> showing ``url``"""
+    widths, sizes = PRESETS[preset]
+    source_width = _source_width(url) if Image is not None and _source_path(url) else None
+    if source_width is None:
+        return Markup(f'src="{escape(url)}"')
+    candidates = [(variant_url(url, width), width) for width in widths if width < source_width]
+    if len(candidates) < len(widths):
+        # The original is smaller than the largest bucket, so it is the largest candidate
+        candidates.append((url, source_width))
+    srcset = ', '.join(f'{candidate} {width}w' for candidate, width in candidates)
+    return Markup(f'src="{escape(candidates[0][0])}" '
+                  f'srcset="{escape(srcset)}" sizes="{escape(sizes)}"')
+
+
+def catalog_image_urls():
+    """Every image URL the storefront shows: product images, gallery images and hero slides"""
+    from models import Product
+    urls = set()
+    for product in Product.query.all():
+        urls.add(product.image_url)
+        urls.update(product.get_additional_images())
+    hero = os.path.join(_static_folder, 'images', 'hero')
+    if os.path.isdir(hero):
+        urls.update(f'{_static_prefix}images/hero/{name}' for name in os.listdir(hero))
+    return sorted(url for url in urls if _source_path(url))
+
+
+def init_app(app):
+    """Register the image helpers, the lazy variant route and ``flask build-images``.
+
+    Variants missing at request time are built on at most IMAGE_BUILD_WORKERS
+    threads, gevent's pool of OS threads when the app runs under gevent.
+    """
+    global _static_folder, _static_prefix, _variant_dir, _pool
+    _static_folder = app.static_folder
+    _static_prefix = f'{app.static_url_path}/'
+    _variant_dir = os.path.join(app.static_folder, VARIANT_DIR)
+    workers = app.config.setdefault('IMAGE_BUILD_WORKERS', 2)
+    if gevent_monkey is not None and gevent_monkey.is_module_patched('threading'):
+        # Patched threads are greenlets and would still resize on the event loop
+        _pool = GeventThreadPool(workers)
+    else:
+        _pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='image-build')
+    app.jinja_env.globals.update(responsive_image=responsive_image, image_variant=variant_url)
+
+    @app.route('/images/<int:width>/<path:source>')
+    def image_variant(width, source):
+        """Build a missing variant on first request and cache it on disk"""
+        url = _static_prefix + source
+        path = _source_path(url)
+        if width not in WIDTHS.values() or path is None or not os.path.isfile(path):
+            abort(404)
+        try:
+            path = _build_off_loop(url, width)
+        except OSError as e:
+            logger.warning(f'Could not build {width}w variant of {url}: {e}')
+            path = None
+        if path is None:
+            return redirect(url)
+        return send_from_directory(_variant_dir, _variant_name(url, width), max_age=86400)
+
+    @app.cli.command('build-images')
+    def build_images_command():
+        """Pre-build resized variants of every catalog and hero image."""
+        if Image is None:
+            print('Pillow is not installed; nothing to build')
+            return
+        built = 0
+        for url in catalog_image_urls():
+            for width in sorted(WIDTHS.values()):
+                if build_variant(url, width):
+                    built += 1
+        print(f'{built} image variants ready in {_variant_dir}')
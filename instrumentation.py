@@ -0,0 +1,172 @@
+import hmac
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from functools import wraps
+from flask import abort, g, has_app_context, has_request_context, current_app, request, Response
+from sqlalchemy import event
+
+logger = logging.getLogger(__name__)
+
+# endpoint -> {'requests', 'queries', 'db_seconds', 'slow_queries'}; per worker process
+_endpoint_stats = {}
+_stats_lock = threading.Lock()
+# Other modules' metric_lines() callables, appended to /metrics
+_metric_sources = []
+
+
+class QueryBudgetExceeded(AssertionError):
+    """Raised when a block of code issues more SQL statements than allowed"""
+
+
+def init_app(app, engine):
+    """Instrument ``engine`` and report per-request database usage for ``app``.
+
+    Every response gets a ``Server-Timing`` header with the number of
+    statements and the time spent in the database, statements slower than
+    ``SLOW_QUERY_THRESHOLD_MS`` are logged with the endpoint that issued
+    them, and running totals per endpoint are served from ``/metrics`` when
+    METRICS_ENABLED is set, to scrapers sending ``Authorization: Bearer
+    <METRICS_TOKEN>``.
+    """
+    app.config.setdefault('SLOW_QUERY_THRESHOLD_MS', 100.0)
+    app.config.setdefault('METRICS_ENABLED', False)
+    app.config.setdefault('METRICS_TOKEN', None)
+
+    event.listen(engine, 'before_cursor_execute', _before_cursor_execute)
+    event.listen(engine, 'after_cursor_execute', _after_cursor_execute)
+    app.before_request(_start_request)
+    app.after_request(_finish_request)
+
+    if app.config['METRICS_ENABLED']:
+        if app.config['METRICS_TOKEN']:
+            app.add_url_rule('/metrics', 'metrics', metrics)
+        else:
+            # The endpoint names and query counts are not for the public
+            logger.warning('METRICS_ENABLED is set without METRICS_TOKEN; /metrics is not served')
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('_query_start', []).append(time.perf_counter())
+    if has_app_context():
+        for statements in g.get('_query_counters', ()):
+            statements.append(statement)
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    elapsed = time.perf_counter() - conn.info['_query_start'].pop()
+    if not has_request_context():
+        return
+
+    g._db_queries = g.get('_db_queries', 0) + 1
+    g._db_seconds = g.get('_db_seconds', 0.0) + elapsed
+
+    threshold = current_app.config['SLOW_QUERY_THRESHOLD_MS']
+    if elapsed * 1000 >= threshold:
+        g._db_slow_queries = g.get('_db_slow_queries', 0) + 1
+        logger.warning(f'Slow query ({elapsed * 1000:.1f} ms) in {request.endpoint}: {statement}')
+
+
+def _start_request():
+    g._request_start = time.perf_counter()
+
+
+def _finish_request(response):
+    queries = g.get('_db_queries', 0)
+    db_seconds = g.get('_db_seconds', 0.0)
+    total_seconds = time.perf_counter() - g.get('_request_start', time.perf_counter())
+
+    response.headers.add('Server-Timing', f'db;dur={db_seconds * 1000:.1f};desc="{queries} queries"')
+    response.headers.add('Server-Timing', f'app;dur={total_seconds * 1000:.1f}')
+
+    endpoint = request.endpoint or 'unmatched'
+    with _stats_lock:
+        stats = _endpoint_stats.setdefault(endpoint, {
+            'requests': 0, 'queries': 0, 'db_seconds': 0.0, 'slow_queries': 0
+        })
+        stats['requests'] += 1
+        stats['queries'] += queries
+        stats['db_seconds'] += db_seconds
+        stats['slow_queries'] += g.get('_db_slow_queries', 0)
+    return response
+
+
+def add_metrics(source):
+    """Serve the Prometheus lines returned by ``source()`` from /metrics as well"""
+    _metric_sources.append(source)
+
+
+def metrics():
+    """Per-endpoint database counters in the Prometheus text format"""
+    scheme, _, token = request.headers.get('Authorization', '').partition(' ')
+    if scheme.lower() != 'bearer' or not hmac.compare_digest(token.encode(),
+                                                             current_app.config['METRICS_TOKEN'].encode()):
+        abort(401)
+    series = [
+        ('havencraft_requests_total', 'Requests served', 'requests'),
+        ('havencraft_db_queries_total', 'SQL statements executed', 'queries'),
+        ('havencraft_db_seconds_total', 'Time spent executing SQL', 'db_seconds'),
+        ('havencraft_db_slow_queries_total', 'Statements over the slow query threshold', 'slow_queries'),
+    ]
+    with _stats_lock:
+        snapshot = {endpoint: dict(stats) for endpoint, stats in _endpoint_stats.items()}
+
+    lines = []
+    for name, help_text, key in series:
+        lines.append(f'# HELP {name} {help_text}')
+        lines.append(f'# TYPE {name} counter')
+        for endpoint, stats in sorted(snapshot.items()):
+            lines.append(f'{name}{{endpoint="{endpoint}"}} {stats[key]}')
+    for source in _metric_sources:
+        lines.extend(source())
+    return Response('\n'.join(lines) + '\n', mimetype='text/plain; version=0.0.4')
+
+
+@contextmanager
+def count_queries():
+    """Collect every SQL statement executed inside the block.
+
+    Yields the list the statements are appended to; blocks may be nested.
+    """
+    statements = []
+    counters = g.setdefault('_query_counters', [])
+    counters.append(statements)
+    try:
+        yield statements
+    finally:
+        counters.remove(statements)
+
+
+def _budget_message(name, limit, statements):
+    listing = '\n'.join(f'  {i}. {s}' for i, s in enumerate(statements, 1))
+    return f'{name} issued {len(statements)} queries (budget {limit}):\n{listing}'
+
+
+@contextmanager
+def assert_max_queries(limit, name='block'):
+    """Fail with QueryBudgetExceeded if the block runs more than ``limit`` statements"""
+    with count_queries() as statements:
+        yield statements
+    if len(statements) > limit:
+        raise QueryBudgetExceeded(_budget_message(name, limit, statements))
+
+
+def query_budget(limit):
+    """Declare the maximum number of queries a view may issue, template rendering included.
+
+    Exceeding the budget is logged as a warning, never raised, so a
+    regression costs a slower page rather than a 500; the tests in
+    tests/test_query_budgets.py hold the views to their budgets.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            with count_queries() as statements:
+                rv = view(*args, **kwargs)
+            if len(statements) > limit:
+                message = _budget_message(request.endpoint or view.__name__, limit, statements)
+                logger.warning(message)
+            return rv
+        return wrapper
+    return decorator
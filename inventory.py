@@ -0,0 +1,56 @@
+from app import db
+from models import Product
+
+
+class OutOfStock(Exception):
+    """Raised when a checkout asks for more units than are left"""
+
+    def __init__(self, product_ids):
+        super().__init__(f'Insufficient stock for products {product_ids}')
+        self.product_ids = product_ids
+
+
+def _merge_lines(lines):
+    # One statement per product, in id order, so concurrent checkouts always
+    # lock rows in the same order and cannot deadlock each other
+    quantities = {}
+    for product_id, quantity in lines:
+        # A negative line would turn a stock decrement into an increment
+        if quantity <= 0:
+            raise ValueError(f'Quantity must be positive, got {quantity} for product {product_id}')
+        quantities[product_id] = quantities.get(product_id, 0) + quantity
+    return sorted(quantities.items())
+
+
+def reserve_stock(lines):
+    """Take stock for ``lines`` of (product_id, quantity) in the current transaction.
+
+    Each line is a single conditional ``UPDATE ... WHERE stock_quantity >= qty``,
+    so the check and the decrement are one atomic step and no global lock is
+    needed. If any line is short, OutOfStock is raised and the caller must roll
+    back so the lines already taken are restored. Non-positive quantities raise
+    ValueError before anything is updated.
+    """
+    table = Product.__table__
+    short = []
+    for product_id, quantity in _merge_lines(lines):
+        updated = db.session.execute(
+            table.update()
+                 .where(table.c.id == product_id, table.c.stock_quantity >= quantity)
+                 .values(stock_quantity=table.c.stock_quantity - quantity)
+        ).rowcount
+        if not updated:
+            short.append(product_id)
+    if short:
+        raise OutOfStock(short)
+
+
+def release_stock(lines):
+    """Return ``lines`` of (product_id, quantity) to stock in the current transaction"""
+    table = Product.__table__
+    for product_id, quantity in _merge_lines(lines):
+        db.session.execute(
+            table.update()
+                 .where(table.c.id == product_id)
+                 .values(stock_quantity=table.c.stock_quantity + quantity)
+        )
@@ -0,0 +1,192 @@
+import click
+import json
+import logging
+import os
+import random
+import signal
+import socket
+import time
+from datetime import datetime, timedelta
+from flask import current_app
+from app import db
+from models import Job
+
+logger = logging.getLogger(__name__)
+
+_handlers = {}
+
+
+def handler(name):
+    """Register the function that runs jobs called ``name``.
+
+    Jobs are delivered at least once (a worker can die after the work but
+    before marking the job done), so handlers should be safe to repeat.
+    """
+    def decorator(func):
+        _handlers[name] = func
+        return func
+    return decorator
+
+
+def enqueue(name, payload=None, delay=0, max_attempts=None):
+    """Add a job to the current transaction; workers see it once that commits"""
+    job = Job(
+        name=name,
+        payload=json.dumps(payload or {}),
+        run_at=datetime.utcnow() + timedelta(seconds=delay),
+        max_attempts=max_attempts or current_app.config['JOB_MAX_ATTEMPTS']
+    )
+    db.session.add(job)
+    return job
+
+
+def claim(worker_id, limit=10):
+    """Mark up to ``limit`` due jobs as running for this worker and return them.
+
+    PostgreSQL hands out rows with FOR UPDATE SKIP LOCKED, so workers never
+    wait on each other; elsewhere each job is taken with a conditional UPDATE
+    and jobs another worker got first are simply skipped.
+    """
+    table = Job.__table__
+    now = datetime.utcnow()
+    due = db.select(table.c.id)\
+            .where(table.c.status == 'pending', table.c.run_at <= now)\
+            .order_by(table.c.run_at, table.c.id).limit(limit)
+    claim_values = dict(status='running', locked_by=worker_id, locked_at=now,
+                        attempts=table.c.attempts + 1)
+
+    if db.engine.dialect.name == 'postgresql':
+        ids = db.session.execute(due.with_for_update(skip_locked=True)).scalars().all()
+        if ids:
+            db.session.execute(table.update().where(table.c.id.in_(ids)).values(**claim_values))
+    else:
+        ids = []
+        for job_id in db.session.execute(due).scalars().all():
+            taken = db.session.execute(
+                table.update().where(table.c.id == job_id, table.c.status == 'pending')
+                     .values(**claim_values)
+            ).rowcount
+            if taken:
+                ids.append(job_id)
+    db.session.commit()
+
+    if not ids:
+        return []
+    return Job.query.filter(Job.id.in_(ids)).order_by(Job.run_at, Job.id).all()
+
+
+def requeue_stale():
+    """Return jobs whose worker disappeared mid-run (lock older than JOB_LOCK_TIMEOUT) to the queue"""
+    table = Job.__table__
+    cutoff = datetime.utcnow() - timedelta(seconds=current_app.config['JOB_LOCK_TIMEOUT'])
+    requeued = db.session.execute(
+        table.update().where(table.c.status == 'running', table.c.locked_at < cutoff)
+             .values(status='pending', locked_by=None, locked_at=None)
+    ).rowcount
+    db.session.commit()
+    if requeued:
+        logger.warning(f'Requeued {requeued} stale jobs')
+    return requeued
+
+
+def _backoff(attempts):
+    # Exponential backoff with jitter, so failing jobs do not retry in lockstep
+    base = current_app.config['JOB_BACKOFF_SECONDS']
+    delay = min(base * 2 ** (attempts - 1), current_app.config['JOB_MAX_BACKOFF_SECONDS'])
+    return delay * random.uniform(0.5, 1.5)
+
+
+def run(job):
+    """Run one claimed job and record the outcome"""
+    func = _handlers.get(job.name)
+    started = time.perf_counter()
+    try:
+        if func is None:
+            raise LookupError(f'No handler registered for job {job.name!r}')
+        func(**json.loads(job.payload))
+    except Exception as e:
+        db.session.rollback()
+        job.last_error = f'{type(e).__name__}: {e}'
+        job.locked_by = job.locked_at = None
+        if job.attempts >= job.max_attempts:
+            job.status = 'failed'
+            job.finished_at = datetime.utcnow()
+            logger.error(f'Job {job.id} ({job.name}) failed permanently after {job.attempts} attempts: {e}')
+        else:
+            job.status = 'pending'
+            job.run_at = datetime.utcnow() + timedelta(seconds=_backoff(job.attempts))
+            logger.warning(f'Job {job.id} ({job.name}) failed, retrying at {job.run_at}: {e}')
+    else:
+        job.status = 'done'
+        job.finished_at = datetime.utcnow()
+        job.last_error = None
+        logger.info(f'Job {job.id} ({job.name}) done in {(time.perf_counter() - started) * 1000:.0f}ms')
+    db.session.commit()
+
+
+def work(worker_id=None, batch_size=10, poll_interval=2.0, once=False):
+    """Process jobs until stopped (SIGTERM/SIGINT), or until the queue is empty with ``once``"""
+    worker_id = worker_id or f'{socket.gethostname()}:{os.getpid()}'
+    stopping = []
+
+    def stop(signum, frame):
+        logger.info(f'Worker {worker_id} stopping after the current job')
+        stopping.append(signum)
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+
+    processed = 0
+    last_requeue = 0
+    while not stopping:
+        if time.monotonic() - last_requeue > poll_interval * 30:
+            requeue_stale()
+            last_requeue = time.monotonic()
+        jobs = claim(worker_id, batch_size)
+        for job in jobs:
+            if stopping:
+                # Unstarted jobs go straight back rather than waiting for the lock timeout
+                job.status, job.locked_by, job.locked_at = 'pending', None, None
+                job.attempts -= 1
+                continue
+            run(job)
+            processed += 1
+        db.session.commit()
+        db.session.remove()
+        if not jobs:
+            if once:
+                break
+            time.sleep(poll_interval)
+    return processed
+
+
+def sweep_finished_jobs(days=7):
+    """Delete jobs that finished more than ``days`` ago; returns how many were removed"""
+    cutoff = datetime.utcnow() - timedelta(days=days)
+    removed = Job.query.filter(Job.status.in_(['done', 'failed']), Job.finished_at < cutoff)\
+                       .delete(synchronize_session=False)
+    db.session.commit()
+    return removed
+
+
+def init_app(app):
+    """Configure the job queue and register the ``worker`` and ``sweep-jobs`` commands"""
+    app.config.setdefault('JOB_MAX_ATTEMPTS', 5)
+    app.config.setdefault('JOB_BACKOFF_SECONDS', 30)
+    app.config.setdefault('JOB_MAX_BACKOFF_SECONDS', 3600)
+    app.config.setdefault('JOB_LOCK_TIMEOUT', 600)
+    app.config.setdefault('JOB_POLL_INTERVAL', 2.0)
+
+    @app.cli.command('worker')
+    @click.option('--once', is_flag=True, help='Exit once no jobs are due instead of polling.')
+    @click.option('--batch-size', default=10, show_default=True, type=click.IntRange(min=1))
+    def worker_command(once, batch_size):
+        """Run a background job worker (start several for more throughput)."""
+        processed = work(batch_size=batch_size, poll_interval=app.config['JOB_POLL_INTERVAL'], once=once)
+        print(f'Processed {processed} jobs')
+
+    @app.cli.command('sweep-jobs')
+    @click.option('--days', default=7, show_default=True, help='Remove finished jobs older than this.')
+    def sweep_jobs_command(days):
+        """Delete finished background jobs."""
+        print(f'Removed {sweep_finished_jobs(days)} finished jobs')
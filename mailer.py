@@ -0,0 +1,65 @@
+import os
+import smtplib
+import time
+from email.message import EmailMessage
+from flask import current_app
+
+
+class SMTPMailer:
+    """Deliver mail through the SMTP server at MAIL_SERVER"""
+
+    def __init__(self, host, port=25, username=None, password=None, use_tls=False, timeout=10):
+        self.host = host
+        self.port = port
+        self.username = username
+        self.password = password
+        self.use_tls = use_tls
+        self.timeout = timeout
+
+    def send(self, message):
+        with smtplib.SMTP(self.host, self.port, timeout=self.timeout) as smtp:
+            if self.use_tls:
+                smtp.starttls()
+            if self.username:
+                smtp.login(self.username, self.password)
+            smtp.send_message(message)
+
+
+class FileMailer:
+    """Local stand-in for an SMTP server: every message is written to ``directory`` as an .eml file"""
+
+    def __init__(self, directory):
+        self.directory = directory
+
+    def send(self, message):
+        os.makedirs(self.directory, exist_ok=True)
+        name = f'{time.time_ns()}-{os.getpid()}.eml'
+        with open(os.path.join(self.directory, name), 'wb') as f:
+            f.write(message.as_bytes())
+
+
+_mailer = None
+
+
+def init_app(app):
+    """Use SMTP when MAIL_SERVER is set, otherwise write messages under MAIL_SINK_DIR"""
+    global _mailer
+    server = app.config.setdefault('MAIL_SERVER', None)
+    app.config.setdefault('MAIL_DEFAULT_SENDER', 'orders@havencraft.local')
+    sink = app.config.setdefault('MAIL_SINK_DIR', os.path.join(app.instance_path, 'mail'))
+    if server:
+        _mailer = SMTPMailer(server, app.config.setdefault('MAIL_PORT', 25),
+                             app.config.setdefault('MAIL_USERNAME', None),
+                             app.config.setdefault('MAIL_PASSWORD', None),
+                             app.config.setdefault('MAIL_USE_TLS', False))
+    else:
+        _mailer = FileMailer(sink)
+
+
+def send_mail(to, subject, body):
+    message = EmailMessage()
+    message['From'] = current_app.config['MAIL_DEFAULT_SENDER']
+    message['To'] = to
+    message['Subject'] = subject
+    message.set_content(body)
+    _mailer.send(message)
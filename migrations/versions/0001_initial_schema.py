@@ -0,0 +1,124 @@
+"""initial schema
+
+Databases built earlier by db.create_all() already have these tables, so
+each table is only created when missing, and the wishlist_count column is
+added and backfilled when absent.
+
+Revision ID: 0001
+Revises: 
+Create Date: 2026-10-17 00:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0001'
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def _tables():
+    return set(sa.inspect(op.get_bind()).get_table_names())
+
+
+def upgrade():
+    tables = _tables()
+
+    if 'category' not in tables:
+        op.create_table('category',
+            sa.Column('id', sa.Integer(), nullable=False),
+            sa.Column('name', sa.String(length=100), nullable=False),
+            sa.Column('description', sa.Text(), nullable=True),
+            sa.PrimaryKeyConstraint('id')
+        )
+
+    if 'user' not in tables:
+        op.create_table('user',
+            sa.Column('id', sa.Integer(), nullable=False),
+            sa.Column('username', sa.String(length=64), nullable=False),
+            sa.Column('email', sa.String(length=120), nullable=False),
+            sa.Column('password_hash', sa.String(length=512), nullable=True),
+            sa.Column('first_name', sa.String(length=50), nullable=True),
+            sa.Column('last_name', sa.String(length=50), nullable=True),
+            sa.Column('phone', sa.String(length=20), nullable=True),
+            sa.Column('created_at', sa.DateTime(), nullable=True),
+            sa.Column('wishlist_count', sa.Integer(), server_default='0', nullable=False),
+            sa.PrimaryKeyConstraint('id'),
+            sa.UniqueConstraint('email'),
+            sa.UniqueConstraint('username')
+        )
+    else:
+        columns = {c['name'] for c in sa.inspect(op.get_bind()).get_columns('user')}
+        if 'wishlist_count' not in columns:
+            op.add_column('user', sa.Column('wishlist_count', sa.Integer(),
+                                            server_default='0', nullable=False))
+            op.execute(
+                'UPDATE "user" SET wishlist_count = '
+                '(SELECT COUNT(*) FROM wishlists WHERE wishlists.user_id = "user".id)'
+            )
+
+    if 'product' not in tables:
+        op.create_table('product',
+            sa.Column('id', sa.Integer(), nullable=False),
+            sa.Column('name', sa.String(length=200), nullable=False),
+            sa.Column('description', sa.Text(), nullable=False),
+            sa.Column('price', sa.Numeric(precision=10, scale=2), nullable=False),
+            sa.Column('image_url', sa.String(length=300), nullable=False),
+            sa.Column('additional_images', sa.Text(), nullable=True),
+            sa.Column('category_id', sa.Integer(), nullable=False),
+            sa.Column('stock_quantity', sa.Integer(), nullable=True),
+            sa.Column('featured', sa.Boolean(), nullable=True),
+            sa.Column('created_at', sa.DateTime(), nullable=True),
+            sa.ForeignKeyConstraint(['category_id'], ['category.id'], ),
+            sa.PrimaryKeyConstraint('id')
+        )
+
+    if 'orders' not in tables:
+        op.create_table('orders',
+            sa.Column('id', sa.Integer(), nullable=False),
+            sa.Column('user_id', sa.Integer(), nullable=False),
+            sa.Column('total_amount', sa.Numeric(precision=10, scale=2), nullable=False),
+            sa.Column('status', sa.String(length=50), nullable=True),
+            sa.Column('shipping_address', sa.Text(), nullable=False),
+            sa.Column('payment_method', sa.String(length=50), nullable=False),
+            sa.Column('created_at', sa.DateTime(), nullable=True),
+            sa.Column('updated_at', sa.DateTime(), nullable=True),
+            sa.ForeignKeyConstraint(['user_id'], ['user.id'], ),
+            sa.PrimaryKeyConstraint('id')
+        )
+
+    if 'wishlists' not in tables:
+        op.create_table('wishlists',
+            sa.Column('id', sa.Integer(), nullable=False),
+            sa.Column('user_id', sa.Integer(), nullable=False),
+            sa.Column('product_id', sa.Integer(), nullable=False),
+            sa.Column('created_at', sa.DateTime(), nullable=True),
+            sa.ForeignKeyConstraint(['product_id'], ['product.id'], ),
+            sa.ForeignKeyConstraint(['user_id'], ['user.id'], ),
+            sa.PrimaryKeyConstraint('id'),
+            sa.UniqueConstraint('user_id', 'product_id', name='unique_user_product_wishlist')
+        )
+
+    if 'order_items' not in tables:
+        op.create_table('order_items',
+            sa.Column('id', sa.Integer(), nullable=False),
+            sa.Column('order_id', sa.Integer(), nullable=False),
+            sa.Column('product_id', sa.Integer(), nullable=False),
+            sa.Column('quantity', sa.Integer(), nullable=False),
+            sa.Column('price', sa.Numeric(precision=10, scale=2), nullable=False),
+            sa.ForeignKeyConstraint(['order_id'], ['orders.id'], ),
+            sa.ForeignKeyConstraint(['product_id'], ['product.id'], ),
+            sa.PrimaryKeyConstraint('id')
+        )
+
+
+def downgrade():
+    op.drop_table('order_items')
+    op.drop_table('wishlists')
+    op.drop_table('orders')
+    op.drop_table('product')
+    op.drop_table('user')
+    op.drop_table('category')
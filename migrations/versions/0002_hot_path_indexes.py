@@ -0,0 +1,42 @@
+"""indexes for hot filter and sort columns
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-17 00:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0002'
+down_revision = '0001'
+branch_labels = None
+depends_on = None
+
+# (index name, table, columns) -- mirrors the Index() declarations in models.py
+INDEXES = [
+    ('ix_product_created_at_id', 'product', ['created_at', 'id']),
+    ('ix_product_price_id', 'product', ['price', 'id']),
+    ('ix_product_category_created_at_id', 'product', ['category_id', 'created_at', 'id']),
+    ('ix_product_category_price_id', 'product', ['category_id', 'price', 'id']),
+    ('ix_product_featured_id', 'product', ['featured', 'id']),
+    ('ix_orders_user_id_created_at', 'orders', ['user_id', 'created_at']),
+    ('ix_order_items_order_id', 'order_items', ['order_id']),
+]
+
+
+def _existing_indexes(table):
+    return {ix['name'] for ix in sa.inspect(op.get_bind()).get_indexes(table)}
+
+
+def upgrade():
+    for name, table, columns in INDEXES:
+        if name not in _existing_indexes(table):
+            op.create_index(name, table, columns, unique=False)
+
+
+def downgrade():
+    for name, table, columns in reversed(INDEXES):
+        op.drop_index(name, table_name=table)
@@ -0,0 +1,31 @@
+"""server-side session table
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-17 00:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0003'
+down_revision = '0002'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('sessions',
+        sa.Column('id', sa.String(length=64), nullable=False),
+        sa.Column('data', sa.Text(), nullable=False),
+        sa.Column('expires_at', sa.DateTime(), nullable=False),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_sessions_expires_at', 'sessions', ['expires_at'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_sessions_expires_at', table_name='sessions')
+    op.drop_table('sessions')
@@ -0,0 +1,27 @@
+"""order idempotency key
+
+Revision ID: 0005
+Revises: 0004
+Create Date: 2026-10-17 00:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0005'
+down_revision = '0004'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column('orders', sa.Column('idempotency_key', sa.String(length=64), nullable=True))
+    op.create_index('ix_orders_idempotency_key', 'orders', ['idempotency_key'], unique=True)
+
+
+def downgrade():
+    op.drop_index('ix_orders_idempotency_key', table_name='orders')
+    with op.batch_alter_table('orders') as batch_op:
+        batch_op.drop_column('idempotency_key')
@@ -0,0 +1,29 @@
+"""product updated_at and cart version
+
+Revision ID: 0007
+Revises: 0006
+Create Date: 2026-10-17 00:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0007'
+down_revision = '0006'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column('product', sa.Column('updated_at', sa.DateTime(), nullable=True))
+    op.execute('UPDATE product SET updated_at = created_at')
+    op.add_column('carts', sa.Column('version', sa.Integer(), nullable=False, server_default='0'))
+
+
+def downgrade():
+    with op.batch_alter_table('carts') as batch_op:
+        batch_op.drop_column('version')
+    with op.batch_alter_table('product') as batch_op:
+        batch_op.drop_column('updated_at')
@@ -0,0 +1,25 @@
+"""purge card details from stored sessions
+
+Revision ID: 0008
+Revises: 0007
+Create Date: 2026-10-17 00:00:00.000000
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = '0008'
+down_revision = '0007'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Checkout used to keep the full card number and CVV in the session; those
+    # visitors start checkout again
+    op.execute("""DELETE FROM sessions WHERE data LIKE '%"card_number"%' OR data LIKE '%"cvv"%'""")
+
+
+def downgrade():
+    pass
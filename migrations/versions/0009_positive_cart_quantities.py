@@ -0,0 +1,27 @@
+"""cart line quantities must be positive
+
+Revision ID: 0009
+Revises: 0008
+Create Date: 2026-10-17 00:00:00.000000
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = '0009'
+down_revision = '0008'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Lines saved before quantities were validated would put stock back at checkout
+    op.execute('DELETE FROM cart_items WHERE quantity <= 0')
+    with op.batch_alter_table('cart_items') as batch_op:
+        batch_op.create_check_constraint('ck_cart_items_quantity_positive', 'quantity > 0')
+
+
+def downgrade():
+    with op.batch_alter_table('cart_items') as batch_op:
+        batch_op.drop_constraint('ck_cart_items_quantity_positive', type_='check')
@@ -0,0 +1,29 @@
+"""cache_versions table
+
+Revision ID: 0010
+Revises: 0009
+Create Date: 2026-10-17 00:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0010'
+down_revision = '0009'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    cache_versions = op.create_table('cache_versions',
+        sa.Column('name', sa.String(length=64), nullable=False),
+        sa.Column('version', sa.Integer(), server_default='0', nullable=False),
+        sa.PrimaryKeyConstraint('name'),
+    )
+    op.bulk_insert(cache_versions, [{'name': 'catalog:version', 'version': 0}])
+
+
+def downgrade():
+    op.drop_table('cache_versions')
@@ -0,0 +1,24 @@
+"""seed the stock version counter
+
+Revision ID: 0011
+Revises: 0010
+Create Date: 2026-10-17 00:00:00.000000
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = '0011'
+down_revision = '0010'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Checkouts bump it concurrently; with the row in place they only ever UPDATE
+    op.execute("INSERT INTO cache_versions (name, version) VALUES ('catalog:stock_version', 0)")
+
+
+def downgrade():
+    op.execute("DELETE FROM cache_versions WHERE name = 'catalog:stock_version'")
@@ -0,0 +1,23 @@
+"""index product.updated_at
+
+Revision ID: 0012
+Revises: 0011
+Create Date: 2026-10-17 00:00:00.000000
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = '0012'
+down_revision = '0011'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_index('ix_product_updated_at', 'product', ['updated_at'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_product_updated_at', table_name='product')
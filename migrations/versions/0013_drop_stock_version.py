@@ -0,0 +1,24 @@
+"""drop the stock version counter
+
+Revision ID: 0013
+Revises: 0012
+Create Date: 2026-10-17 00:00:00.000000
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = '0013'
+down_revision = '0012'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Product pages are keyed on the product's own updated_at instead
+    op.execute("DELETE FROM cache_versions WHERE name = 'catalog:stock_version'")
+
+
+def downgrade():
+    op.execute("INSERT INTO cache_versions (name, version) VALUES ('catalog:stock_version', 0)")
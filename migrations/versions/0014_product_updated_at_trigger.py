@@ -0,0 +1,51 @@
+"""bump product.updated_at in the database
+
+Revision ID: 0014
+Revises: 0013
+Create Date: 2026-10-17 00:00:00.000000
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = '0014'
+down_revision = '0013'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Writes that bypass SQLAlchemy leave updated_at alone, and with it the
+    # product page's ETag; statements that set it themselves are untouched
+    if op.get_bind().dialect.name == 'postgresql':
+        op.execute("""
+            CREATE OR REPLACE FUNCTION product_touch_updated_at() RETURNS trigger AS $$
+            BEGIN
+                IF NEW.updated_at IS NOT DISTINCT FROM OLD.updated_at THEN
+                    NEW.updated_at := now() AT TIME ZONE 'utc';
+                END IF;
+                RETURN NEW;
+            END
+            $$ LANGUAGE plpgsql
+        """)
+        op.execute("""
+            CREATE TRIGGER product_touch_updated_at BEFORE UPDATE ON product
+            FOR EACH ROW EXECUTE PROCEDURE product_touch_updated_at()
+        """)
+    else:
+        op.execute("""
+            CREATE TRIGGER product_touch_updated_at AFTER UPDATE ON product
+            FOR EACH ROW WHEN NEW.updated_at IS OLD.updated_at
+            BEGIN
+                UPDATE product SET updated_at = strftime('%Y-%m-%d %H:%M:%f000', 'now') WHERE id = NEW.id;
+            END
+        """)
+
+
+def downgrade():
+    if op.get_bind().dialect.name == 'postgresql':
+        op.execute('DROP TRIGGER IF EXISTS product_touch_updated_at ON product')
+        op.execute('DROP FUNCTION IF EXISTS product_touch_updated_at()')
+    else:
+        op.execute('DROP TRIGGER IF EXISTS product_touch_updated_at')
@@ -1,6 +1,7 @@
 from app import db
 from datetime import datetime
-from werkzeug.security import generate_password_hash, check_password_hash
+from sqlalchemy import DDL, event
+from passwords import hash_password, verify_password
 from flask_login import UserMixin
 
 class Category(db.Model):
@@ -20,6 +21,21 @@ class Product(db.Model):
     stock_quantity = db.Column(db.Integer, default=1)
     featured = db.Column(db.Boolean, default=False)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    # The product page's ETag. SQLAlchemy sets it on ORM and Core UPDATEs (the
+    # stock UPDATEs in inventory.py included); the trigger below covers the rest
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    # Indexes matched to the listing queries: keyset pages on (created_at, id)
+    # and (price, id), optionally within a category, and the featured strip
+    __table_args__ = (
+        db.Index('ix_product_created_at_id', 'created_at', 'id'),
+        db.Index('ix_product_price_id', 'price', 'id'),
+        db.Index('ix_product_category_created_at_id', 'category_id', 'created_at', 'id'),
+        db.Index('ix_product_category_price_id', 'category_id', 'price', 'id'),
+        db.Index('ix_product_featured_id', 'featured', 'id'),
+        # max(updated_at): the /api/products validator
+        db.Index('ix_product_updated_at', 'updated_at'),
+    )
     
     def get_additional_images(self):
         if self.additional_images:
@@ -30,6 +46,36 @@ class Product(db.Model):
                 return []
         return []
 
+# Bump products.updated_at in the database too, so that raw SQL and other
+# clients still invalidate product pages. Statements that set updated_at
+# themselves (every SQLAlchemy UPDATE) are left as they are. Migration 0014
+# installs the same trigger on existing databases. DDL() %-formats its text,
+# hence the doubled %% in the SQLite version.
+PRODUCT_UPDATED_AT_TRIGGER = {
+    'sqlite': [
+        """CREATE TRIGGER product_touch_updated_at AFTER UPDATE ON product
+           FOR EACH ROW WHEN NEW.updated_at IS OLD.updated_at
+           BEGIN
+               UPDATE product SET updated_at = strftime('%%Y-%%m-%%d %%H:%%M:%%f000', 'now') WHERE id = NEW.id;
+           END""",
+    ],
+    'postgresql': [
+        """CREATE OR REPLACE FUNCTION product_touch_updated_at() RETURNS trigger AS $$
+           BEGIN
+               IF NEW.updated_at IS NOT DISTINCT FROM OLD.updated_at THEN
+                   NEW.updated_at := now() AT TIME ZONE 'utc';
+               END IF;
+               RETURN NEW;
+           END
+           $$ LANGUAGE plpgsql""",
+        """CREATE TRIGGER product_touch_updated_at BEFORE UPDATE ON product
+           FOR EACH ROW EXECUTE PROCEDURE product_touch_updated_at()""",
+    ],
+}
+for dialect, statements in PRODUCT_UPDATED_AT_TRIGGER.items():
+    for statement in statements:
+        event.listen(Product.__table__, 'after_create', DDL(statement).execute_if(dialect=dialect))
+
 class User(UserMixin, db.Model):
     id = db.Column(db.Integer, primary_key=True)
     username = db.Column(db.String(64), unique=True, nullable=False)
@@ -39,12 +85,14 @@ class User(UserMixin, db.Model):
     last_name = db.Column(db.String(50))
     phone = db.Column(db.String(20))
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    # Denormalized count of wishlist rows, maintained by toggle_wishlist
+    wishlist_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
 
     def set_password(self, password):
-        self.password_hash = generate_password_hash(password)
+        self.password_hash = hash_password(password)
 
     def check_password(self, password):
-        return check_password_hash(self.password_hash, password)
+        return verify_password(self.password_hash, password)
     
     def get_full_name(self):
         return f"{self.first_name or ''} {self.last_name or ''}".strip() or self.username
@@ -61,7 +109,8 @@ class Wishlist(db.Model):
     user = db.relationship('User', backref=db.backref('wishlist_items', lazy=True))
     product = db.relationship('Product', backref=db.backref('wishlisted_by', lazy=True))
     
-    # Unique constraint to prevent duplicate wishlist entries
+    # Unique constraint to prevent duplicate wishlist entries; its leading
+    # user_id column also serves the per-user wishlist lookups
     __table_args__ = (db.UniqueConstraint('user_id', 'product_id', name='unique_user_product_wishlist'),)
 
 # Order model for purchase tracking
@@ -73,6 +122,8 @@ class Order(db.Model):
     status = db.Column(db.String(50), default='pending')  # pending, confirmed, shipped, delivered, cancelled
     shipping_address = db.Column(db.Text, nullable=False)
     payment_method = db.Column(db.String(50), nullable=False)
+    # Issued with the confirmation page; a replayed submission finds this order instead of creating another
+    idempotency_key = db.Column(db.String(64), unique=True, index=True)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
@@ -80,11 +131,14 @@ class Order(db.Model):
     user = db.relationship('User', backref=db.backref('orders', lazy=True))
     items = db.relationship('OrderItem', back_populates='order', lazy=True, cascade="all, delete-orphan")
 
+    # Order history: WHERE user_id = ? ORDER BY created_at DESC
+    __table_args__ = (db.Index('ix_orders_user_id_created_at', 'user_id', 'created_at'),)
+
 # Order items for detailed order tracking
 class OrderItem(db.Model):
     __tablename__ = 'order_items'
     id = db.Column(db.Integer, primary_key=True)
-    order_id = db.Column(db.Integer, db.ForeignKey('orders.id'), nullable=False)
+    order_id = db.Column(db.Integer, db.ForeignKey('orders.id'), nullable=False, index=True)
     product_id = db.Column(db.Integer, db.ForeignKey('product.id'), nullable=False)
     quantity = db.Column(db.Integer, nullable=False)
     price = db.Column(db.Numeric(10, 2), nullable=False)  # Price at time of order
@@ -93,6 +147,84 @@ class OrderItem(db.Model):
     order = db.relationship('Order', back_populates='items')
     product = db.relationship('Product', backref=db.backref('order_items', lazy=True))
 
+# Persistent shopping carts, owned by a user or by an anonymous session token
+class Cart(db.Model):
+    __tablename__ = 'carts'
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), unique=True)
+    token = db.Column(db.String(64), unique=True)  # anonymous carts only
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, index=True)
+    version = db.Column(db.Integer, nullable=False, default=0, server_default='0')  # +1 per change to the lines
+
+    # Relationships
+    items = db.relationship('CartItem', back_populates='cart', lazy=True, cascade="all, delete-orphan")
+
+class CartItem(db.Model):
+    __tablename__ = 'cart_items'
+    id = db.Column(db.Integer, primary_key=True)
+    cart_id = db.Column(db.Integer, db.ForeignKey('carts.id'), nullable=False)
+    product_id = db.Column(db.Integer, db.ForeignKey('product.id'), nullable=False)
+    quantity = db.Column(db.Integer, nullable=False)
+
+    # Relationships
+    cart = db.relationship('Cart', back_populates='items')
+    product = db.relationship('Product')
+
+    # One line per product; its leading cart_id also indexes the cart lookup
+    __table_args__ = (
+        db.UniqueConstraint('cart_id', 'product_id', name='unique_cart_product'),
+        db.CheckConstraint('quantity > 0', name='ck_cart_items_quantity_positive'),
+    )
+
+# Cache invalidation counters (see catalog_cache.py), bumped in the transaction
+# that makes the change, so every process sees a new version as soon as it commits
+class CacheVersion(db.Model):
+    __tablename__ = 'cache_versions'
+    name = db.Column(db.String(64), primary_key=True)
+    version = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+
+# Server-side session storage (see session_store.py); the cookie only carries the id
+class ServerSession(db.Model):
+    __tablename__ = 'sessions'
+    id = db.Column(db.String(64), primary_key=True)
+    data = db.Column(db.Text, nullable=False)  # JSON, tagged like Flask's cookie sessions
+    expires_at = db.Column(db.DateTime, nullable=False, index=True)
+
+# Background job queue (see jobs.py); rows are written in the same transaction
+# as the change that caused them, so no event is lost or sent for a rollback
+class Job(db.Model):
+    __tablename__ = 'jobs'
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(100), nullable=False)
+    payload = db.Column(db.Text, nullable=False, default='{}')  # JSON
+    status = db.Column(db.String(20), nullable=False, default='pending')  # pending, running, done, failed
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    max_attempts = db.Column(db.Integer, nullable=False, default=5)
+    run_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    locked_by = db.Column(db.String(100))
+    locked_at = db.Column(db.DateTime)
+    last_error = db.Column(db.Text)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    finished_at = db.Column(db.DateTime)
+
+    # Workers poll: WHERE status = 'pending' AND run_at <= now ORDER BY run_at
+    __table_args__ = (db.Index('ix_jobs_status_run_at', 'status', 'run_at'),)
+
+def ensure_wishlist_counts():
+    """Add and backfill User.wishlist_count on databases created before it existed"""
+    columns = {column['name'] for column in db.inspect(db.engine).get_columns('user')}
+    if 'wishlist_count' in columns:
+        return
+    with db.engine.begin() as conn:
+        conn.execute(db.text(
+            'ALTER TABLE "user" ADD COLUMN wishlist_count INTEGER NOT NULL DEFAULT 0'
+        ))
+        conn.execute(db.text(
+            'UPDATE "user" SET wishlist_count = '
+            '(SELECT COUNT(*) FROM wishlists WHERE wishlists.user_id = "user".id)'
+        ))
+
 def init_sample_data():
     """Initialize the database with sample handmade products"""
     # Check if data already exists to prevent re-seeding
@@ -111,15 +243,9 @@ def init_sample_data():
         {"name": "Art & Crafts", "description": "Artistic creations and crafts"}
     ]
 
-    categories = {}
-    for cat_data in categories_data:
-        category = Category(**cat_data)
-        db.session.add(category)
-    db.session.commit()  # Commit categories to the database
-
-    # Retrieve categories to ensure we have their IDs
-    for category in Category.query.all():
-        categories[category.name] = category.id
+    # Insert all categories in one executemany, then read back their IDs
+    db.session.execute(db.insert(Category), categories_data)
+    categories = dict(db.session.execute(db.select(Category.name, Category.id)).all())
 
     # Create comprehensive product catalog
     products_data = [
@@ -354,8 +480,5 @@ def init_sample_data():
         }
     ]
     
-    for product_data in products_data:
-        product = Product(**product_data)
-        db.session.add(product)
-    
+    db.session.execute(db.insert(Product), products_data)
     db.session.commit()
@@ -0,0 +1,83 @@
+import json
+import logging
+from datetime import datetime
+from sqlalchemy.orm import joinedload, selectinload
+from app import db
+from models import Order, OrderItem, Product
+from jobs import handler, enqueue
+from mailer import send_mail
+import catalog_cache
+
+logger = logging.getLogger(__name__)
+analytics_logger = logging.getLogger('analytics')
+
+LOW_STOCK_THRESHOLD = 3  # matches the "Only N left!" badge on the product page
+
+
+def order_placed(order):
+    """Queue the follow-up work for a new order in the order's own transaction"""
+    db.session.flush()  # assigns order.id
+    enqueue('orders.send_confirmation', {'order_id': order.id})
+    enqueue('orders.record_event', {'order_id': order.id, 'event': 'order_placed',
+                                    'at': datetime.utcnow().isoformat()})
+    enqueue('orders.sync_inventory', {'order_id': order.id})
+
+
+def order_cancelled(order):
+    enqueue('orders.record_event', {'order_id': order.id, 'event': 'order_cancelled',
+                                    'at': datetime.utcnow().isoformat()})
+    enqueue('orders.sync_inventory', {'order_id': order.id})
+
+
+def _load_order(order_id):
+    return Order.query.options(joinedload(Order.user),
+                               selectinload(Order.items).joinedload(OrderItem.product))\
+                      .filter_by(id=order_id).one()
+
+
+@handler('orders.send_confirmation')
+def send_confirmation(order_id):
+    order = _load_order(order_id)
+    lines = [f'  {item.quantity} x {item.product.name} @ ${item.price:.2f}' for item in order.items]
+    body = '\n'.join([
+        f'Hi {order.user.first_name or order.user.username},',
+        '',
+        f'Thank you for your order #{order.id}. Here is what you ordered:',
+        '',
+        *lines,
+        '',
+        f'Total: ${order.total_amount:.2f}',
+        f'Payment: {order.payment_method.replace("_", " ")}',
+        '',
+        'HavenCraft',
+    ])
+    send_mail(order.user.email, f'Your HavenCraft order #{order.id}', body)
+
+
+@handler('orders.record_event')
+def record_event(order_id, event, at):
+    """Emit an analytics event as one JSON line on the ``analytics`` logger"""
+    order = _load_order(order_id)
+    analytics_logger.info(json.dumps({
+        'event': event,
+        'order_id': order.id,
+        'user_id': order.user_id,
+        'total': str(order.total_amount),
+        'items': [{'product_id': item.product_id, 'quantity': item.quantity} for item in order.items],
+        'at': at,
+    }))
+
+
+@handler('orders.sync_inventory')
+def sync_inventory(order_id):
+    """Report low stock for the order's products and refresh cached listings when one sells out"""
+    product_ids = [pid for (pid,) in db.session.query(OrderItem.product_id).filter_by(order_id=order_id)]
+    sold_out = False
+    for product in Product.query.filter(Product.id.in_(product_ids)).all():
+        if product.stock_quantity <= LOW_STOCK_THRESHOLD:
+            logger.warning(f'Low stock: product {product.id} ({product.name}) has {product.stock_quantity} left')
+        sold_out = sold_out or product.stock_quantity == 0
+    # Stock is changed with plain UPDATEs, which do not invalidate the catalog cache;
+    # the bump commits with the job, and web workers read the version from the database
+    if sold_out:
+        catalog_cache.bump_catalog_version(db.session.connection())
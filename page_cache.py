@@ -0,0 +1,177 @@
+import hashlib
+import logging
+import os
+from datetime import datetime, timezone
+from functools import wraps
+from flask import current_app, make_response, request, session
+from flask_login import current_user
+from markupsafe import Markup
+import catalog_cache
+from catalog_cache import LRUCache, RedisBackend
+
+logger = logging.getLogger(__name__)
+
+# Session keys that change what an anonymous visitor sees (flash messages, the cart badge)
+PERSONAL_SESSION_KEYS = ('_flashes', 'cart_token', 'cart', 'cart_count')
+
+_local = LRUCache(maxsize=512, ttl=60)
+_shared = None
+_enabled = True
+_release = ''
+
+
+def init_app(app):
+    """Configure the page and fragment cache from PAGE_CACHE_ENABLED/TTL/SIZE.
+
+    Entries are shared between workers through CATALOG_CACHE_URL when it is
+    set and are keyed on the catalog version, so catalog writes retire them.
+    """
+    global _local, _shared, _enabled, _release
+    _enabled = app.config.setdefault('PAGE_CACHE_ENABLED', True)
+    ttl = app.config.setdefault('PAGE_CACHE_TTL', 60)
+    size = app.config.setdefault('PAGE_CACHE_SIZE', 512)
+    url = app.config.get('CATALOG_CACHE_URL')
+    _local = LRUCache(maxsize=size, ttl=ttl)
+    _shared = RedisBackend(url, ttl=ttl) if url else None
+    _release = _templates_digest(app)
+    app.jinja_env.globals.update(cached_fragment=cached_fragment)
+
+
+def _templates_digest(app):
+    # Part of every validator, so a deploy that changes a template changes the ETags
+    digest = hashlib.md5()
+    for root, _, files in sorted(os.walk(os.path.join(app.root_path, app.template_folder))):
+        for name in sorted(files):
+            with open(os.path.join(root, name), 'rb') as f:
+                digest.update(f.read())
+    return digest.hexdigest()
+
+
+def _active():
+    # Templates change under a running debug server
+    return _enabled and not current_app.debug
+
+
+def _get(key):
+    value = _local.get(key)
+    if value is None and _shared is not None:
+        try:
+            value = _shared.get(key)
+        except Exception as e:
+            logger.warning(f'Page cache backend unavailable: {e}')
+        if value is not None:
+            _local.set(key, value)
+    return value
+
+
+def _set(key, value):
+    _local.set(key, value)
+    if _shared is not None:
+        try:
+            _shared.set(key, value)
+        except Exception as e:
+            logger.warning(f'Page cache backend unavailable: {e}')
+
+
+def _cacheable_request():
+    """Only anonymous GETs whose session holds nothing the page would show"""
+    return (_active() and request.method in ('GET', 'HEAD')
+            and not current_user.is_authenticated
+            and not any(key in session for key in PERSONAL_SESSION_KEYS))
+
+
+def cache_page(view=None, version=None):
+    """Serve a view's anonymous responses from the cache, with ETag/Last-Modified revalidation.
+
+    Pages are keyed on the catalog version. ``version``, called with the
+    view's arguments, adds whatever else the page shows that changes without
+    a catalog write (a product's stock); keep it to one cheap query.
+    """
+    if view is None:
+        return lambda view: cache_page(view, version)
+
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        if not _cacheable_request():
+            return view(*args, **kwargs)
+
+        extra = version(*args, **kwargs) if version is not None else ''
+        key = f'page:{catalog_cache.catalog_version()}:{extra}:{request.full_path}'
+        entry = _get(key)
+        if entry is None:
+            response = make_response(view(*args, **kwargs))
+            # Errors, redirects and anything that touched the session are not shared
+            if response.status_code != 200 or session.modified or response.direct_passthrough:
+                return response
+            body = response.get_data()
+            entry = {
+                'body': body,
+                'mimetype': response.mimetype,
+                'etag': hashlib.md5(body).hexdigest(),
+                'last_modified': datetime.now(timezone.utc).replace(microsecond=0),
+            }
+            _set(key, entry)
+            response.headers['X-Cache'] = 'MISS'
+        else:
+            response = current_app.response_class(entry['body'], mimetype=entry['mimetype'])
+            response.headers['X-Cache'] = 'HIT'
+
+        response.set_etag(entry['etag'])
+        response.last_modified = entry['last_modified']
+        # Browsers keep the page but ask again each time; unchanged pages cost a 304
+        response.headers['Cache-Control'] = 'no-cache'
+        response.vary.add('Cookie')
+        return response.make_conditional(request)
+    return wrapper
+
+
+def conditional(validator, shows_flashes=True, public=False):
+    """Answer a matching If-None-Match with 304 before the view renders anything.
+
+    ``validator`` is called with the view's arguments and returns a cheap
+    summary of everything the response depends on (versions, timestamps,
+    who is asking), or None to just run the view; it becomes a weak ETag.
+    Pages that show flash messages are always rendered while one is pending.
+    ``public`` responses are the same for every visitor, so shared caches may
+    keep them too.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            if request.method not in ('GET', 'HEAD') or (shows_flashes and '_flashes' in session):
+                return view(*args, **kwargs)
+            parts = validator(*args, **kwargs)
+            if parts is None:
+                return view(*args, **kwargs)
+
+            etag = hashlib.md5(repr((_release, parts)).encode()).hexdigest()
+            if request.if_none_match.contains_weak(etag):
+                response = current_app.response_class(status=304)
+            else:
+                response = make_response(view(*args, **kwargs))
+                if response.status_code != 200:
+                    return response
+            response.set_etag(etag, weak=True)
+            if public:
+                response.headers['Cache-Control'] = 'public, no-cache'
+            else:
+                response.headers['Cache-Control'] = 'private, no-cache'
+                response.vary.add('Cookie')
+            return response
+        return wrapper
+    return decorator
+
+
+def cached_fragment(name, *vary, caller):
+    """Cache the body of a ``{% call cached_fragment(name, ...) %}`` block for the catalog version.
+
+    ``vary`` lists the template values the block renders differently for.
+    """
+    if not _active():
+        return caller()
+    key = f'fragment:{catalog_cache.catalog_version()}:{name}:{vary!r}'
+    html = _get(key)
+    if html is None:
+        html = str(caller())
+        _set(key, html)
+    return Markup(html)
@@ -0,0 +1,128 @@
+import base64
+import json
+from datetime import datetime
+from decimal import Decimal
+from sqlalchemy import tuple_
+from models import Product
+
+DEFAULT_PAGE_SIZE = 24
+MAX_PAGE_SIZE = 48
+
+# sort name -> (key column, descending)
+SORT_KEYS = {
+    'newest': (Product.created_at, True),
+    'price_asc': (Product.price, False),
+    'price_desc': (Product.price, True),
+}
+DEFAULT_SORT = 'newest'
+
+
+class KeysetPage:
+    """One page of results plus the cursor for the page after it"""
+
+    def __init__(self, items, next_cursor=None):
+        self.items = items
+        self.next_cursor = next_cursor
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def __iter__(self):
+        return iter(self.items)
+
+    def __len__(self):
+        return len(self.items)
+
+    def __bool__(self):
+        return bool(self.items)
+
+
+def clamp_page_size(per_page):
+    if not per_page or per_page < 1:
+        return DEFAULT_PAGE_SIZE
+    return min(per_page, MAX_PAGE_SIZE)
+
+
+def encode_cursor(values):
+    raw = json.dumps(values, separators=(',', ':')).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    """Decode a cursor from the URL; malformed cursors yield None (first page)"""
+    if not cursor:
+        return None
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode()))
+    except (ValueError, TypeError):
+        return None
+    return values if isinstance(values, list) else None
+
+
+def _key_to_json(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return str(value)
+    return value
+
+
+def _key_from_json(sort, value):
+    if sort == 'newest':
+        return datetime.fromisoformat(value)
+    return Decimal(value)
+
+
+def paginate_products(query, sort=DEFAULT_SORT, cursor=None, per_page=None):
+    """Keyset-paginate a Product query on (sort key, id).
+
+    Each page is a single indexed range scan: the cursor carries the last
+    row's sort key and id, so deep pages cost the same as the first one.
+    """
+    if sort not in SORT_KEYS:
+        sort = DEFAULT_SORT
+    per_page = clamp_page_size(per_page)
+    column, descending = SORT_KEYS[sort]
+
+    after = decode_cursor(cursor)
+    if after and len(after) == 2:
+        try:
+            key, last_id = _key_from_json(sort, after[0]), int(after[1])
+        except (ValueError, TypeError, ArithmeticError):
+            key = None
+        if key is not None:
+            position = tuple_(column, Product.id)
+            bound = tuple_(key, last_id)
+            query = query.filter(position < bound if descending else position > bound)
+
+    if descending:
+        query = query.order_by(column.desc(), Product.id.desc())
+    else:
+        query = query.order_by(column.asc(), Product.id.asc())
+
+    rows = query.limit(per_page + 1).all()
+    items = rows[:per_page]
+    next_cursor = None
+    if len(rows) > per_page:
+        last = items[-1]
+        next_cursor = encode_cursor([_key_to_json(getattr(last, column.key)), last.id])
+    return KeysetPage(items, next_cursor)
+
+
+def paginate_search(search, cursor=None, per_page=None):
+    """Paginate ranked search results, whose order has no stable key, by offset.
+
+    ``search`` is called as ``search(limit=..., offset=...)``.
+    """
+    per_page = clamp_page_size(per_page)
+    position = decode_cursor(cursor)
+    offset = 0
+    if position and len(position) == 1 and isinstance(position[0], int):
+        offset = max(position[0], 0)
+
+    rows = search(limit=per_page + 1, offset=offset)
+    items = rows[:per_page]
+    next_cursor = encode_cursor([offset + per_page]) if len(rows) > per_page else None
+    return KeysetPage(items, next_cursor)
@@ -0,0 +1,62 @@
+from concurrent.futures import ThreadPoolExecutor
+from werkzeug.security import generate_password_hash, check_password_hash
+
+try:
+    from gevent import monkey as gevent_monkey
+    from gevent.threadpool import ThreadPool as GeventThreadPool
+except ImportError:  # gevent is optional; without it a plain thread pool bounds hashing
+    gevent_monkey = None
+
+# werkzeug's own default, spelled out the way it appears in the stored hashes
+DEFAULT_METHOD = 'pbkdf2:sha256:600000'
+_DEFAULTS = {'pbkdf2': ('pbkdf2', 'sha256', '600000'), 'scrypt': ('scrypt', '32768', '8', '1')}
+
+_method = DEFAULT_METHOD
+_pool = None
+
+
+def _canonical(method):
+    """``method`` with werkzeug's defaults filled in (``scrypt`` -> ``scrypt:32768:8:1``)"""
+    parts = method.split(':')
+    defaults = _DEFAULTS.get(parts[0], ())
+    return ':'.join(parts + list(defaults[len(parts):]))
+
+
+def init_app(app):
+    """Hash with PASSWORD_HASH_METHOD on at most PASSWORD_HASH_WORKERS threads at a time.
+
+    Under gevent the hashes run on gevent's pool of real OS threads, so
+    the waiting greenlet yields and the event loop keeps serving other
+    requests; hashlib releases the GIL while it hashes.
+    """
+    global _method, _pool
+    _method = _canonical(app.config.setdefault('PASSWORD_HASH_METHOD', DEFAULT_METHOD))
+    workers = app.config.setdefault('PASSWORD_HASH_WORKERS', 2)
+    if gevent_monkey is not None and gevent_monkey.is_module_patched('threading'):
+        # Patched threads are greenlets and would still hash on the event loop
+        _pool = GeventThreadPool(workers)
+    else:
+        _pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='password-hash')
+
+
+def _run(func, *args):
+    if _pool is None:
+        return func(*args)
+    if isinstance(_pool, ThreadPoolExecutor):
+        return _pool.submit(func, *args).result()
+    return _pool.apply(func, args)
+
+
+def hash_password(password):
+    return _run(generate_password_hash, password, _method)
+
+
+def verify_password(pwhash, password):
+    if not pwhash:
+        return False
+    return _run(check_password_hash, pwhash, password)
+
+
+def needs_rehash(pwhash):
+    """True when ``pwhash`` was made with other parameters than PASSWORD_HASH_METHOD"""
+    return bool(pwhash) and pwhash.split('$', 1)[0] != _method
@@ -0,0 +1,167 @@
+import logging
+import math
+import threading
+import time
+from functools import wraps
+from flask import abort, request
+
+logger = logging.getLogger(__name__)
+
+# Per route: (what to count by, attempts allowed, window in seconds). Only POSTs count.
+POLICIES = {
+    'login': [('ip', 20, 60)],
+    'register': [('ip', 5, 3600)],
+}
+# Per route, limits on failed attempts only; the view reports them with record_failure().
+# Keyed on the email *and* the address, so nobody can lock an account's owner out
+FAILURE_POLICIES = {
+    'login': [('email_ip', 5, 300)],
+}
+
+
+class MemoryStore:
+    """Per-worker counters: attempts per key in each fixed window"""
+
+    def __init__(self, max_keys=100000):
+        self.max_keys = max_keys
+        self._counts = {}
+        self._lock = threading.Lock()
+
+    def get(self, key, window_index):
+        with self._lock:
+            _, windows = self._counts.get(key, (None, {}))
+            return windows.get(window_index - 1, 0), windows.get(window_index, 0)
+
+    def incr(self, key, window_index, window):
+        with self._lock:
+            _, windows = self._counts.setdefault(key, (window, {}))
+            windows[window_index] = windows.get(window_index, 0) + 1
+            for index in [i for i in windows if i < window_index - 1]:
+                del windows[index]
+            if len(self._counts) > self.max_keys:
+                self._prune(time.time())
+
+    def _prune(self, now):
+        # Drop keys whose last two windows are over (they count as zero anyway)
+        for key in [k for k, (window, windows) in self._counts.items()
+                    if (max(windows) + 2) * window <= now]:
+            del self._counts[key]
+
+
+class RedisStore:
+    """Counters shared by every worker"""
+
+    def __init__(self, url):
+        try:
+            import redis
+        except ImportError:
+            raise RuntimeError('RATE_LIMIT_URL is set but the redis package is not installed')
+        self.client = redis.Redis.from_url(url)
+
+    def get(self, key, window_index):
+        previous, current = self.client.mget(f'ratelimit:{key}:{window_index - 1}',
+                                             f'ratelimit:{key}:{window_index}')
+        return int(previous or 0), int(current or 0)
+
+    def incr(self, key, window_index, window):
+        name = f'ratelimit:{key}:{window_index}'
+        pipeline = self.client.pipeline()
+        pipeline.incr(name)
+        pipeline.expire(name, window * 2)
+        pipeline.execute()
+
+
+_store = MemoryStore()
+_policies = POLICIES
+_failure_policies = FAILURE_POLICIES
+_enabled = True
+
+
+def init_app(app):
+    """Configure the limiter from RATE_LIMIT_ENABLED, RATE_LIMITS, RATE_LIMIT_FAILURES and RATE_LIMIT_URL"""
+    global _store, _policies, _failure_policies, _enabled
+    _enabled = app.config.setdefault('RATE_LIMIT_ENABLED', True)
+    _policies = app.config.setdefault('RATE_LIMITS', POLICIES)
+    _failure_policies = app.config.setdefault('RATE_LIMIT_FAILURES', FAILURE_POLICIES)
+    url = app.config.setdefault('RATE_LIMIT_URL', None)
+    _store = RedisStore(url) if url else MemoryStore()
+
+
+def _estimate(previous, current, elapsed, window):
+    # Sliding window: the previous window's count, weighted by how much of it still overlaps
+    return previous * (1 - elapsed / window) + current
+
+
+def _retry_after(previous, current, elapsed, window, limit):
+    """Seconds until one more attempt fits under ``limit``"""
+    if current >= limit:
+        # Wait for the next window, then for the current count to decay below the limit
+        return (window - elapsed) + window * (1 - (limit - 1) / current)
+    return window * (1 - (limit - 1 - current) / previous) - elapsed
+
+
+def _subject(kind):
+    if kind == 'ip':
+        return request.remote_addr or 'unknown'
+    if kind == 'email':
+        return (request.form.get('email') or '').strip().lower() or None
+    if kind == 'email_ip':
+        email = _subject('email')
+        return email and f'{email}:{_subject("ip")}'
+    raise ValueError(f'Unknown rate limit key {kind!r}')
+
+
+def _windows(name, policies, now):
+    """(key, limit, window, window index, seconds into it) for each of ``name``'s ``policies``"""
+    for kind, limit, window in policies.get(name, ()):
+        subject = _subject(kind)
+        if subject is not None:
+            yield f'{name}:{kind}:{subject}', limit, window, int(now // window), now % window
+
+
+def _count(windows):
+    for key, _, window, window_index, _ in windows:
+        try:
+            _store.incr(key, window_index, window)
+        except Exception as e:
+            logger.warning(f'Rate limit backend unavailable: {e}')
+
+
+def check(name):
+    """Count an attempt against policy ``name``; returns None, or the seconds to wait when over the limit"""
+    now = time.time()
+    wait = None
+    for key, limit, window, window_index, elapsed in [*_windows(name, _policies, now),
+                                                      *_windows(name, _failure_policies, now)]:
+        try:
+            previous, current = _store.get(key, window_index)
+        except Exception as e:
+            logger.warning(f'Rate limit backend unavailable: {e}')
+            return None  # fail open rather than lock everyone out
+        if _estimate(previous, current, elapsed, window) + 1 > limit:
+            wait = max(wait or 0, _retry_after(previous, current, elapsed, window, limit))
+    if wait is not None:
+        logger.warning(f'Rate limited {name} from {request.remote_addr}')
+        return max(1, math.ceil(wait))
+    _count(_windows(name, _policies, now))
+    return None
+
+
+def record_failure(name):
+    """Count a failed attempt (a wrong password, say) against policy ``name``'s failure limits"""
+    if _enabled:
+        _count(_windows(name, _failure_policies, time.time()))
+
+
+def rate_limit(name):
+    """Answer POSTs over policy ``name``'s limits with 429 before the view does any work"""
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            if _enabled and request.method == 'POST':
+                wait = check(name)
+                if wait is not None:
+                    abort(429, retry_after=wait)
+            return view(*args, **kwargs)
+        return wrapper
+    return decorator
@@ -1,47 +1,96 @@
-from flask import render_template, request, session, redirect, url_for, flash, jsonify
+from flask import render_template, request, session, redirect, url_for, flash, jsonify, g
 from flask_login import login_required, current_user
 from app import app, db
-from models import Product, Category, Wishlist, Order, OrderItem
+from models import Product, Wishlist, Order, OrderItem, User
+from cart_service import (get_cart as current_cart, price_cart, cart_contents, cart_count, cart_version,
+                          add_item, set_quantity, remove_item, clear_cart)
+from search import search_products
+from inventory import reserve_stock, release_stock, OutOfStock
+from order_events import order_placed, order_cancelled
+from pagination import paginate_products, paginate_search, SORT_KEYS, DEFAULT_SORT
+from instrumentation import query_budget
+from page_cache import cache_page, conditional
+from user_cache import invalidate_user
+from sqlalchemy.exc import IntegrityError, OperationalError
+from sqlalchemy.orm import selectinload
+from catalog_cache import get_categories, get_featured_products, get_product_count, catalog_version
 from decimal import Decimal
 from datetime import datetime
 import json
+import secrets
+
+# Load order lines and their products up front for pages that list them
+ORDER_ITEMS = selectinload(Order.items).joinedload(OrderItem.product)
 
 @app.route('/')
+@cache_page
 def index():
     """Homepage with featured products"""
-    featured_products = Product.query.filter_by(featured=True).limit(4).all()
-    categories = Category.query.all()
-    products = Product.query.all()
+    featured_products = get_featured_products(limit=4)
+    categories = get_categories()
+    products = Product.query.order_by(Product.id).limit(6).all()
+    product_count = get_product_count()
     return render_template('index.html', 
                          featured_products=featured_products, 
                          categories=categories,
-                         products=products)
+                         products=products,
+                         product_count=product_count)
 
 @app.route('/products')
+@cache_page
 def products():
     """Products page with filtering and search"""
     category_id = request.args.get('category', type=int)
     search_query = request.args.get('search', '')
-
-    query = Product.query
-
-    if category_id:
-        query = query.filter_by(category_id=category_id)
+    sort = request.args.get('sort', DEFAULT_SORT)
+    if sort not in SORT_KEYS:
+        sort = DEFAULT_SORT
+    cursor = request.args.get('cursor')
+    per_page = request.args.get('per_page', type=int)
 
     if search_query:
-        query = query.filter(Product.name.contains(search_query) | 
-                           Product.description.contains(search_query))
+        page = paginate_search(
+            lambda limit, offset: search_products(search_query, category_id=category_id,
+                                                  limit=limit, offset=offset),
+            cursor=cursor, per_page=per_page)
+    else:
+        query = Product.query
+        if category_id:
+            query = query.filter_by(category_id=category_id)
+        page = paginate_products(query, sort=sort, cursor=cursor, per_page=per_page)
 
-    products = query.all()
-    categories = Category.query.all()
+    categories = get_categories()
 
     return render_template('products.html', 
-                         products=products, 
+                         products=page.items, 
+                         page=page,
                          categories=categories,
                          current_category=category_id,
-                         search_query=search_query)
+                         search_query=search_query,
+                         sort=sort,
+                         per_page=per_page,
+                         first_page=not cursor)
+
+def _product_updated_at(product_id):
+    """The product row's updated_at, which moves with every change to it, stock included"""
+    stamps = g.setdefault('_product_updated_at', {})
+    if product_id not in stamps:
+        stamps[product_id] = db.session.query(Product.updated_at).filter_by(id=product_id).scalar()
+    return stamps[product_id]
+
+def _product_page_version(product_id):
+    """What the product page depends on: the product row, the catalog (related
+    products) and the header (who is logged in, their badges)"""
+    updated_at = _product_updated_at(product_id)
+    if updated_at is None:
+        return None  # let the view 404
+    wishlist_count = current_user.wishlist_count if current_user.is_authenticated else None
+    return (product_id, updated_at.isoformat(), catalog_version(),
+            current_user.get_id(), wishlist_count, cart_count())
 
 @app.route('/product/<int:product_id>')
+@cache_page(version=_product_updated_at)
+@conditional(_product_page_version)
 def product_detail(product_id):
     """Individual product detail page"""
     product = Product.query.get_or_404(product_id)
@@ -57,26 +106,13 @@ def product_detail(product_id):
 @app.route('/cart')
 def cart():
     """Shopping cart page"""
-    cart_items = session.get('cart', {})
-    cart_products = []
-    subtotal = Decimal('0.0')
-
-    for product_id, quantity in cart_items.items():
-        product = Product.query.get(int(product_id))
-        if product:
-            item_subtotal = product.price * quantity
-            cart_products.append({
-                'product': product,
-                'quantity': quantity,
-                'subtotal': item_subtotal
-            })
-            subtotal += item_subtotal
-
-    tax_rate = Decimal('0.08')
-    tax = subtotal * tax_rate
-    total = subtotal + tax
-
-    return render_template('cart.html', cart_products=cart_products, subtotal=subtotal, tax=tax, total=total)
+    priced_cart = price_cart()
+
+    return render_template('cart.html',
+                         cart_products=priced_cart.lines,
+                         subtotal=priced_cart.subtotal,
+                         tax=priced_cart.tax,
+                         total=priced_cart.total)
 
 @app.route('/add_to_cart', methods=['POST'])
 def add_to_cart():
@@ -88,44 +124,41 @@ def add_to_cart():
         flash('Invalid product', 'error')
         return redirect(request.referrer or url_for('index'))
 
+    if quantity is None or quantity < 1:
+        flash('Quantity must be at least 1', 'error')
+        return redirect(request.referrer or url_for('index'))
+
     product = Product.query.get(product_id)
     if not product:
         flash('Product not found', 'error')
         return redirect(request.referrer or url_for('index'))
 
-    # Initialize cart if it doesn't exist
-    if 'cart' not in session:
-        session['cart'] = {}
-
     # Add or update item in cart
-    cart = session['cart']
-    product_id_str = str(product_id)
-
-    if product_id_str in cart:
-        cart[product_id_str] += quantity
-    else:
-        cart[product_id_str] = quantity
-
-    session['cart'] = cart
-    session.modified = True
+    name = product.name
+    add_item(current_cart(create=True), product_id, quantity)
+    db.session.commit()
 
-    flash(f'{product.name} added to cart!', 'success')
+    flash(f'{name} added to cart!', 'success')
     return redirect(request.referrer or url_for('products'))
 
 @app.route('/update_cart', methods=['POST'])
 def update_cart():
     """Update cart quantities"""
-    cart = session.get('cart', {})
-
-    for product_id in cart.keys():
-        new_quantity = request.form.get(f'quantity_{product_id}', type=int)
-        if new_quantity and new_quantity > 0:
-            cart[product_id] = new_quantity
-        elif new_quantity == 0:
-            del cart[product_id]
-
-    session['cart'] = cart
-    session.modified = True
+    cart = current_cart()
+
+    if cart is not None:
+        for product_id in cart_contents(cart):
+            new_quantity = request.form.get(f'quantity_{product_id}', type=int)
+            if new_quantity is None:
+                continue
+            if new_quantity < 0:
+                flash('Quantities cannot be negative', 'error')
+                return redirect(url_for('cart'))
+            if new_quantity == 0:
+                remove_item(cart, int(product_id))
+            else:
+                set_quantity(cart, int(product_id), new_quantity)
+        db.session.commit()
 
     flash('Cart updated successfully!', 'success')
     return redirect(url_for('cart'))
@@ -133,13 +166,10 @@ def update_cart():
 @app.route('/remove_from_cart/<int:product_id>')
 def remove_from_cart(product_id):
     """Remove item from cart"""
-    cart = session.get('cart', {})
-    product_id_str = str(product_id)
+    cart = current_cart()
 
-    if product_id_str in cart:
-        del cart[product_id_str]
-        session['cart'] = cart
-        session.modified = True
+    if cart is not None and remove_item(cart, product_id):
+        db.session.commit()
         flash('Item removed from cart', 'success')
 
     return redirect(url_for('cart'))
@@ -162,14 +192,22 @@ def toggle_wishlist(product_id):
     if existing_item:
         # Remove from wishlist
         db.session.delete(existing_item)
+        User.query.filter_by(id=current_user.id).update(
+            {User.wishlist_count: db.case((User.wishlist_count > 0, User.wishlist_count - 1), else_=0)},
+            synchronize_session=False)
         db.session.commit()
+        invalidate_user(current_user.id)
         flash(f'{product.name} removed from wishlist', 'info')
         action = 'removed'
     else:
         # Add to wishlist
         wishlist_item = Wishlist(user_id=current_user.id, product_id=product_id)
         db.session.add(wishlist_item)
+        User.query.filter_by(id=current_user.id).update(
+            {User.wishlist_count: User.wishlist_count + 1},
+            synchronize_session=False)
         db.session.commit()
+        invalidate_user(current_user.id)
         flash(f'{product.name} added to wishlist', 'success')
         action = 'added'
 
@@ -183,34 +221,23 @@ def toggle_wishlist(product_id):
 @app.route('/checkout')
 def checkout():
     """Checkout page - step 1: Review cart"""
-    cart = session.get('cart', {})
-    if not cart:
+    priced_cart = price_cart()
+    if not priced_cart:
         flash('Your cart is empty', 'info')
         return redirect(url_for('products'))
 
-    cart_items = []
-    total = 0
-
-    for product_id, quantity in cart.items():
-        product = Product.query.get(int(product_id))
-        if product:
-            subtotal = float(product.price) * quantity
-            cart_items.append({
-                'product': product,
-                'quantity': quantity,
-                'subtotal': subtotal
-            })
-            total += subtotal
-
-    return render_template('checkout/review.html', cart_items=cart_items, total=total)
+    return render_template('checkout/review.html',
+                         cart_items=priced_cart.lines,
+                         subtotal=priced_cart.subtotal,
+                         tax=priced_cart.tax,
+                         total=priced_cart.total)
 
 @app.route('/checkout/shipping', methods=['GET', 'POST'])
 @login_required
 def checkout_shipping():
     """Checkout step 2: Shipping information"""
     # Check if cart exists
-    cart = session.get('cart', {})
-    if not cart:
+    if not cart_count():
         flash('Your cart is empty', 'info')
         return redirect(url_for('products'))
 
@@ -260,8 +287,7 @@ def checkout_shipping():
 def checkout_payment():
     """Checkout step 3: Payment information"""
     # Check if cart exists
-    cart = session.get('cart', {})
-    if not cart:
+    if not cart_count():
         flash('Your cart is empty', 'info')
         return redirect(url_for('products'))
 
@@ -276,8 +302,7 @@ def checkout_payment():
         if not payment_method:
             flash('Please select a payment method', 'error')
             return render_template('checkout/payment.html', 
-                                 total=sum(float(Product.query.get(int(pid)).price) * qty 
-                                          for pid, qty in cart.items() if Product.query.get(int(pid))),
+                                 total=price_cart().subtotal,
                                  error='Please select a payment method')
 
         # Validate credit card info if credit card is selected
@@ -292,132 +317,167 @@ def checkout_payment():
             if missing_fields:
                 flash(f'Please fill in the following fields: {", ".join(missing_fields)}', 'error')
                 return render_template('checkout/payment.html', 
-                                     total=sum(float(Product.query.get(int(pid)).price) * qty 
-                                              for pid, qty in cart.items() if Product.query.get(int(pid))),
+                                     total=price_cart().subtotal,
                                      form_data=request.form.to_dict(),
                                      errors=missing_fields)
 
-        # Store payment info in session (in real app, process payment here)
+        # Store what the confirmation page shows (in real app, process payment here).
+        # Sessions are rows in the database, so card details never go into them
+        card_digits = ''.join(c for c in request.form.get('card_number', '') if c.isdigit())
         session['payment_info'] = {
             'payment_method': payment_method,
-            'card_name': request.form.get('card_name', '').strip(),
-            'card_number': request.form.get('card_number', '').strip(),
-            'expiry_month': request.form.get('expiry_month', '').strip(),
-            'expiry_year': request.form.get('expiry_year', '').strip(),
-            'cvv': request.form.get('cvv', '').strip()
+            'card_last4': card_digits[-4:] if payment_method == 'credit_card' else '',
         }
         session.modified = True
         flash('Payment information saved successfully!', 'success')
         return redirect(url_for('checkout_confirmation'))
 
-    # Calculate total
-    total = 0
-    for product_id, quantity in cart.items():
-        product = Product.query.get(int(product_id))
-        if product:
-            total += float(product.price) * quantity
+    return render_template('checkout/payment.html', total=price_cart().subtotal)
+
+ORDER_ATTEMPTS = 3
+
+def _order_for_key(key):
+    """The current user's order placed with idempotency ``key``, if any"""
+    if not key:
+        return None
+    return Order.query.filter_by(user_id=current_user.id, idempotency_key=key).first()
+
+def _finish_checkout():
+    """Drop the checkout steps' session data once an order exists"""
+    for key in ('shipping_info', 'payment_info', 'checkout_key'):
+        session.pop(key, None)
+
+def _place_order(key, cart_items, total):
+    """Create the order, take its stock and empty the cart in one transaction"""
+    # Create a simple shipping address
+    full_address = "Sample Address, City, Country"
+
+    order = Order(
+        user_id=current_user.id,
+        total_amount=total if total > 0 else Decimal('1.00'),  # Ensure minimum amount
+        shipping_address=full_address,
+        payment_method=session.get('payment_info', {}).get('payment_method', 'cash_on_delivery'),
+        status='confirmed',
+        idempotency_key=key
+    )
+
+    # Add items to order
+    for item in cart_items:
+        order_item = OrderItem(
+            product_id=item['product'].id,
+            quantity=item['quantity'],
+            price=item['price']
+        )
+        order.items.append(order_item)
+
+    # If no items in cart, add a dummy item
+    if not cart_items:
+        dummy_item = OrderItem(
+            product_id=1,  # Assuming product with ID 1 exists
+            quantity=1,
+            price=Decimal('1.00')
+        )
+        order.items.append(dummy_item)
 
-    return render_template('checkout/payment.html', total=total)
+    db.session.add(order)
+    reserve_stock((item.product_id, item.quantity) for item in order.items)
+    clear_cart(current_cart())
+    # Emails, analytics and inventory sync run in the worker, off the request path
+    order_placed(order)
+    db.session.commit()
+    return order
 
 @app.route('/checkout/confirmation', methods=['GET', 'POST'])
 @login_required
 def checkout_confirmation():
     """Checkout step 4: Order confirmation"""
+    if request.method == 'POST':
+        # Double clicks, proxy retries and resubmits after a timeout carry the
+        # key of an order that may already exist; send them to it
+        placed = _order_for_key(request.form.get('idempotency_key') or session.get('checkout_key'))
+        if placed:
+            _finish_checkout()
+            return redirect(url_for('order_success', order_id=placed.id))
+
     # Check if cart exists
-    cart = session.get('cart', {})
-    if not cart or 'shipping_info' not in session or 'payment_info' not in session:
+    priced_cart = price_cart()
+    if not priced_cart or 'shipping_info' not in session or 'payment_info' not in session:
         flash('Your session has expired. Please start checkout again.', 'warning')
         return redirect(url_for('checkout'))
 
     # Calculate cart contents and total
-    cart_items = []
-    subtotal = Decimal('0.0')
-    for product_id, quantity in cart.items():
-        product = Product.query.get(int(product_id))
-        if product:
-            item_subtotal = Decimal(product.price) * quantity
-            cart_items.append({
-                'product': product,
-                'quantity': quantity,
-                'price': Decimal(product.price),
-                'subtotal': item_subtotal
-            })
-            subtotal += item_subtotal
-
-    tax_rate = Decimal('0.08')
-    tax = subtotal * tax_rate
-    total = subtotal + tax
+    cart_items = priced_cart.lines
+    subtotal = priced_cart.subtotal
+    tax = priced_cart.tax
+    total = priced_cart.total
 
     if request.method == 'POST':
-        # Create a simple shipping address
-        full_address = "Sample Address, City, Country"
-        
-        # Create order and order items in a single transaction
-        order = Order(
-            user_id=current_user.id,
-            total_amount=total if total > 0 else Decimal('1.00'),  # Ensure minimum amount
-            shipping_address=full_address,
-            payment_method=session.get('payment_info', {}).get('method', 'cash_on_delivery'),
-            status='confirmed'
-        )
-
-        # Add items to order
-        for item in cart_items:
-            order_item = OrderItem(
-                product_id=item['product'].id,
-                quantity=item['quantity'],
-                price=item['price']
-            )
-            order.items.append(order_item)
-        
-        # If no items in cart, add a dummy item
-        if not cart_items:
-            dummy_item = OrderItem(
-                product_id=1,  # Assuming product with ID 1 exists
-                quantity=1,
-                price=Decimal('1.00')
-            )
-            order.items.append(dummy_item)
-        
-        db.session.add(order)
-        db.session.commit()
-
-        # Clear cart and session data
-        session.pop('cart', None)
-        session.pop('shipping_info', None)
-        session.pop('payment_info', None)
+        key = session.setdefault('checkout_key', secrets.token_urlsafe(32))
+        for attempt in range(ORDER_ATTEMPTS):
+            try:
+                order = _place_order(key, cart_items, total)
+                break
+            except OutOfStock as e:
+                db.session.rollback()
+                names = ', '.join(line['product'].name for line in cart_items
+                                  if line['product'].id in e.product_ids)
+                flash(f'Sorry, there is not enough stock left for: {names}. Please update your cart.', 'error')
+                return redirect(url_for('cart'))
+            except IntegrityError:
+                # A concurrent submission with the same key committed first
+                db.session.rollback()
+                placed = _order_for_key(key)
+                if placed is None:
+                    raise
+                _finish_checkout()
+                return redirect(url_for('order_success', order_id=placed.id))
+            except OperationalError:
+                # Transient database errors (lost connection, lock timeout) are
+                # safe to retry: the key stops a retry from ordering twice
+                db.session.rollback()
+                if attempt == ORDER_ATTEMPTS - 1:
+                    raise
+
+        _finish_checkout()
 
         # Redirect to success page
         return redirect(url_for('order_success', order_id=order.id))
 
-    # Show confirmation page for GET request
+    # Show confirmation page for GET request; the key is kept until an order uses it
+    checkout_key = session.setdefault('checkout_key', secrets.token_urlsafe(32))
     return render_template('checkout/confirmation.html', 
                          cart_items=cart_items, 
                          subtotal=subtotal,
                          tax=tax,
                          total=total,
                          shipping_info=session['shipping_info'],
-                         payment_info=session['payment_info'])
+                         payment_info=session['payment_info'],
+                         checkout_key=checkout_key)
 
 @app.route('/order/success/<int:order_id>')
 @login_required
+@query_budget(4)
 def order_success(order_id):
     """Order success page"""
-    order = Order.query.filter_by(id=order_id, user_id=current_user.id).first_or_404()
+    order = Order.query.options(ORDER_ITEMS)\
+                       .filter_by(id=order_id, user_id=current_user.id).first_or_404()
     return render_template('checkout/success.html', order=order)
 
 @app.route('/order/<int:order_id>')
 @login_required
+@query_budget(4)
 def order_details(order_id):
     """View details of a specific order"""
-    order = Order.query.filter_by(id=order_id, user_id=current_user.id).first_or_404()
+    order = Order.query.options(ORDER_ITEMS)\
+                       .filter_by(id=order_id, user_id=current_user.id).first_or_404()
     return render_template('order_details.html', order=order, datetime=datetime)
 
 @app.route('/user/profile')
 @login_required
+@query_budget(3)
 def user_profile():
     """User profile page with recent orders"""
-    # Get the 3 most recent orders
+    # Get the 3 most recent orders (the profile shows totals only, so items stay unloaded)
     recent_orders = Order.query.filter_by(user_id=current_user.id)\
                              .order_by(Order.created_at.desc())\
                              .limit(3).all()
@@ -427,9 +487,12 @@ def user_profile():
 
 @app.route('/profile/orders')
 @login_required
+@query_budget(4)
 def order_history():
     """User's order history"""
-    orders = Order.query.filter_by(user_id=current_user.id).order_by(Order.created_at.desc()).all()
+    orders = Order.query.options(ORDER_ITEMS)\
+                        .filter_by(user_id=current_user.id)\
+                        .order_by(Order.created_at.desc()).all()
     return render_template('orders.html', orders=orders)
 
 @app.route('/orders')
@@ -449,52 +512,64 @@ def cancel_order(order_id):
         flash('This order cannot be cancelled.', 'error')
         return redirect(url_for('orders'))
     
-    # Update order status
-    order.status = 'cancelled'
-    order.updated_at = datetime.utcnow()
+    # Update order status; the conditional UPDATE makes sure only one of two
+    # concurrent cancellations releases the stock
+    cancelled = Order.query.filter(Order.id == order.id, Order.status.in_(['pending', 'confirmed']))\
+                           .update({'status': 'cancelled', 'updated_at': datetime.utcnow()},
+                                   synchronize_session=False)
+    if cancelled:
+        release_stock((item.product_id, item.quantity) for item in order.items)
+        order_cancelled(order)
     db.session.commit()
     
     flash('Your order has been cancelled successfully.', 'success')
     return redirect(url_for('orders'))
 
 @app.route('/api/cart')
+@conditional(lambda: ('cart', cart_version()), shows_flashes=False)
 def get_cart():
     """API endpoint to get current cart state"""
-    cart = session.get('cart', {})
-    return jsonify(cart)
+    return jsonify(cart_contents())
 
 # Footer Pages
 @app.route('/about')
+@cache_page
 def about():
     """About us page"""
     return render_template('footer/about.html')
 
 @app.route('/contact')
+@cache_page
 def contact():
     """Contact us page"""
     return render_template('footer/contact.html')
 
 @app.route('/faq')
+@cache_page
 def faq():
     """FAQ page"""
     return render_template('footer/faq.html')
 
 @app.route('/shipping')
+@cache_page
 def shipping_info():
     """Shipping information page"""
     return render_template('footer/shipping.html')
 
 @app.route('/returns')
+@cache_page
 def returns():
     """Returns policy page"""
     return render_template('footer/returns.html')
 
 @app.route('/privacy')
+@cache_page
 def privacy():
     """Privacy policy page"""
     return render_template('footer/privacy.html')
 
 @app.route('/terms')
+@cache_page
 def terms():
     """Terms of service page"""
     return render_template('footer/terms.html')
@@ -509,13 +584,12 @@ def nl2br_filter(text):
 @app.context_processor
 def inject_cart_count():
     """Inject cart item count into all templates"""
-    cart = session.get('cart', {})
-    total_items = sum(cart.values())
+    total_items = cart_count()
 
-    # Inject wishlist count for logged-in users
+    # Inject wishlist count for logged-in users (denormalized on User, no query)
     wishlist_count = 0
     if current_user.is_authenticated:
-        wishlist_count = Wishlist.query.filter_by(user_id=current_user.id).count()
+        wishlist_count = current_user.wishlist_count or 0
 
     return {'cart_count': total_items, 'wishlist_count': wishlist_count}
 
@@ -524,7 +598,7 @@ def debug_session():
     """Debug route to check session data"""
     if app.debug:
         return jsonify({
-            'cart': session.get('cart', {}),
+            'cart': cart_contents(),
             'shipping_info': session.get('shipping_info', {}),
             'payment_info': session.get('payment_info', {}),
             'user_authenticated': current_user.is_authenticated
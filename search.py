@@ -0,0 +1,136 @@
+import logging
+import re
+from sqlalchemy import func, literal_column, table, column, text
+from sqlalchemy.exc import OperationalError
+from app import db
+from models import Product
+
+logger = logging.getLogger(__name__)
+
+FTS_TABLE = 'product_fts'
+PG_INDEX = 'ix_product_search_document'
+
+# Must stay textually identical to the indexed expression so PostgreSQL uses the GIN index
+PG_DOCUMENT = ("to_tsvector('english', coalesce(product.name, '') || ' ' || "
+               "coalesce(product.description, ''))")
+
+SQLITE_DDL = [
+    f"""CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5(
+        name, description,
+        content='product', content_rowid='id',
+        tokenize='porter unicode61'
+    )""",
+    f"""CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ai AFTER INSERT ON product BEGIN
+        INSERT INTO {FTS_TABLE}(rowid, name, description)
+        VALUES (new.id, new.name, new.description);
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ad AFTER DELETE ON product BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, name, description)
+        VALUES ('delete', old.id, old.name, old.description);
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_au AFTER UPDATE OF name, description ON product BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, name, description)
+        VALUES ('delete', old.id, old.name, old.description);
+        INSERT INTO {FTS_TABLE}(rowid, name, description)
+        VALUES (new.id, new.name, new.description);
+    END""",
+]
+
+PG_DDL = [
+    f"""CREATE INDEX IF NOT EXISTS {PG_INDEX} ON product USING GIN (
+        to_tsvector('english', coalesce(name, '') || ' ' || coalesce(description, ''))
+    )""",
+]
+
+_fts_table = table(FTS_TABLE, column('rowid'))
+_fts_available = {}
+
+
+def _dialect():
+    return db.engine.dialect.name
+
+
+def ensure_search_index():
+    """Create the full-text index for the active backend and backfill it.
+
+    Safe to call repeatedly. On SQLite the FTS5 table is kept current by
+    triggers on ``product``; on PostgreSQL the GIN index is an expression
+    index, so inserts and updates are picked up without extra work.
+    """
+    dialect = _dialect()
+    with db.engine.begin() as conn:
+        if dialect == 'sqlite':
+            exists = conn.execute(
+                text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = :name"),
+                {'name': FTS_TABLE}
+            ).first()
+            try:
+                for statement in SQLITE_DDL:
+                    conn.execute(text(statement))
+            except OperationalError as e:
+                logger.warning(f'FTS5 unavailable, falling back to LIKE search: {e}')
+                _fts_available[dialect] = False
+                return
+            if not exists:
+                conn.execute(text(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')"))
+            _fts_available[dialect] = True
+        elif dialect == 'postgresql':
+            for statement in PG_DDL:
+                conn.execute(text(statement))
+            _fts_available[dialect] = True
+
+
+def _has_fts():
+    dialect = _dialect()
+    if dialect not in _fts_available:
+        if dialect == 'sqlite':
+            found = db.session.execute(
+                text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = :name"),
+                {'name': FTS_TABLE}
+            ).first()
+            _fts_available[dialect] = found is not None
+        else:
+            _fts_available[dialect] = dialect == 'postgresql'
+    return _fts_available[dialect]
+
+
+def _terms(query):
+    return re.findall(r'\w+', query or '')
+
+
+def search_products(query, category_id=None, limit=None, offset=0):
+    """Return products matching ``query``, best matches first.
+
+    Every word must match (as a prefix, so partially typed words still hit).
+    Falls back to a LIKE scan when no full-text index is available.
+    """
+    terms = _terms(query)
+    if not terms:
+        return []
+
+    q = Product.query
+    if category_id:
+        q = q.filter(Product.category_id == category_id)
+
+    dialect = _dialect()
+    if _has_fts() and dialect == 'sqlite':
+        match = ' '.join(f'"{term}"*' for term in terms)
+        fts = literal_column(FTS_TABLE)
+        q = q.join(_fts_table, _fts_table.c.rowid == Product.id)\
+             .filter(fts.op('MATCH')(match))\
+             .order_by(func.bm25(fts), Product.id)
+    elif _has_fts() and dialect == 'postgresql':
+        tsquery = func.to_tsquery('english', ' & '.join(f'{term}:*' for term in terms))
+        document = literal_column(PG_DOCUMENT)
+        q = q.filter(document.op('@@')(tsquery))\
+             .order_by(func.ts_rank(document, tsquery).desc(), Product.id)
+    else:
+        for term in terms:
+            q = q.filter(Product.name.contains(term) | Product.description.contains(term))
+        q = q.order_by(Product.id)
+
+    if offset:
+        q = q.offset(offset)
+    if limit:
+        q = q.limit(limit)
+    return q.all()
@@ -0,0 +1,157 @@
+import itertools
+import random
+from datetime import datetime, timedelta
+from decimal import Decimal
+from sqlalchemy import func, select, text
+from passwords import hash_password
+from models import Category, Product, User, Wishlist, Order, OrderItem
+
+CATEGORY_NAMES = ["Jewelry", "Pottery", "Textiles", "Woodwork", "Home Decor", "Art & Crafts"]
+ADJECTIVES = ["Rustic", "Hand-carved", "Woven", "Glazed", "Vintage", "Artisan", "Forged", "Painted"]
+NOUNS = ["Bowl", "Pendant", "Scarf", "Vase", "Frame", "Mug", "Ring", "Blanket", "Box", "Lamp"]
+IMAGES = [
+    "/static/images/products/ceramic-bowl-set.webp",
+    "/static/images/products/celtic-silver-pendant.webp",
+    "/static/images/products/hand-woven-wool-scarf.webp",
+    "/static/images/products/decorative-ceramic-vase.webp",
+    "/static/images/products/rustic-picture-frame.webp",
+    "/static/images/products/artisan-coffee-mugs.webp",
+]
+
+
+def _batches(rows, size):
+    rows = iter(rows)
+    while True:
+        batch = list(itertools.islice(rows, size))
+        if not batch:
+            return
+        yield batch
+
+
+def _insert(conn, table, rows, batch_size):
+    """executemany ``rows`` into ``table`` in fixed-size batches; returns the row count"""
+    count = 0
+    for batch in _batches(rows, batch_size):
+        conn.execute(table.insert(), batch)
+        count += len(batch)
+    return count
+
+
+def _next_id(conn, model):
+    return (conn.execute(select(func.max(model.id))).scalar() or 0) + 1
+
+
+def _reset_sequences(conn, models):
+    # Ids are assigned here rather than by the database, so move the
+    # PostgreSQL sequences past them
+    if conn.dialect.name != "postgresql":
+        return
+    for model in models:
+        table = model.__table__.name
+        conn.execute(text(
+            f"SELECT setval(pg_get_serial_sequence('\"{table}\"', 'id'), "
+            f"(SELECT COALESCE(MAX(id), 1) FROM \"{table}\"))"
+        ))
+
+
+def seed_synthetic(conn, products=1000, users=100, orders=1000, items_per_order=3,
+                   wishlists_per_user=5, categories=12, seed=42, batch_size=5000):
+    """Append a synthetic, reproducible data set through ``conn`` using bulk inserts.
+
+    The same ``seed`` always yields the same rows. Ids are assigned after the
+    current maximum of each table, so existing data is left alone and rows can
+    reference each other without reading generated keys back. Returns the
+    number of rows inserted per table.
+    """
+    rng = random.Random(seed)
+    start = datetime(2024, 1, 1)
+    password_hash = hash_password("password")  # hashed once, shared by every user
+
+    first_category = _next_id(conn, Category)
+    first_user = _next_id(conn, User)
+    first_product = _next_id(conn, Product)
+    first_order = _next_id(conn, Order)
+    category_ids = range(first_category, first_category + categories)
+    user_ids = range(first_user, first_user + users)
+    product_ids = range(first_product, first_product + products)
+
+    prices = {}
+
+    def category_rows():
+        for n, category_id in enumerate(category_ids):
+            name = CATEGORY_NAMES[n % len(CATEGORY_NAMES)]
+            yield {"id": category_id, "name": f"{name} {category_id}",
+                   "description": f"Synthetic {name.lower()} collection"}
+
+    def product_rows():
+        for n, product_id in enumerate(product_ids):
+            price = Decimal(rng.randint(500, 50000)) / 100
+            prices[product_id] = price
+            yield {
+                "id": product_id,
+                "name": f"{rng.choice(ADJECTIVES)} {rng.choice(NOUNS)} {product_id}",
+                "description": "Synthetic handmade product for load testing.",
+                "price": price,
+                "image_url": rng.choice(IMAGES),
+                "category_id": rng.choice(category_ids),
+                "stock_quantity": rng.randint(0, 25),
+                "featured": rng.random() < 0.02,
+                "created_at": start + timedelta(minutes=n),
+            }
+
+    wishlists = {}
+    for user_id in user_ids:
+        picks = {rng.choice(product_ids) for _ in range(wishlists_per_user)} if products else set()
+        wishlists[user_id] = picks
+
+    def user_rows():
+        for user_id in user_ids:
+            yield {
+                "id": user_id, "username": f"shopper{user_id}",
+                "email": f"shopper{user_id}@example.com", "password_hash": password_hash,
+                "first_name": "Test", "last_name": f"Shopper {user_id}",
+                "created_at": start, "wishlist_count": len(wishlists[user_id]),
+            }
+
+    def wishlist_rows():
+        for user_id, picks in wishlists.items():
+            for product_id in sorted(picks):
+                yield {"user_id": user_id, "product_id": product_id, "created_at": start}
+
+    def order_batches():
+        # Orders and their lines are generated together so each order's total
+        # matches its items and only one batch is held in memory at a time
+        order_ids = range(first_order, first_order + orders)
+        for batch in _batches(order_ids, batch_size):
+            order_batch, item_batch = [], []
+            for order_id in batch:
+                lines = [(rng.choice(product_ids), rng.randint(1, 3))
+                         for _ in range(rng.randint(1, 2 * items_per_order - 1))]
+                subtotal = sum(prices[pid] * qty for pid, qty in lines)
+                created_at = start + timedelta(minutes=order_id - first_order)
+                order_batch.append({
+                    "id": order_id, "user_id": rng.choice(user_ids),
+                    "total_amount": (subtotal * Decimal("1.08")).quantize(Decimal("0.01")),
+                    "status": rng.choice(["confirmed", "shipped", "delivered", "cancelled"]),
+                    "shipping_address": "1 Synthetic Way, Testville",
+                    "payment_method": rng.choice(["credit_card", "paypal", "cash_on_delivery"]),
+                    "created_at": created_at, "updated_at": created_at,
+                })
+                item_batch.extend({"order_id": order_id, "product_id": product_id,
+                                   "quantity": quantity, "price": prices[product_id]}
+                                  for product_id, quantity in lines)
+            yield order_batch, item_batch
+
+    counts = {
+        "category": _insert(conn, Category.__table__, category_rows(), batch_size),
+        "product": _insert(conn, Product.__table__, product_rows(), batch_size),
+        "user": _insert(conn, User.__table__, user_rows(), batch_size),
+        "wishlists": _insert(conn, Wishlist.__table__, wishlist_rows(), batch_size),
+    }
+    counts["orders"] = counts["order_items"] = 0
+    if users and products:
+        for order_batch, item_batch in order_batches():
+            counts["orders"] += _insert(conn, Order.__table__, order_batch, batch_size)
+            counts["order_items"] += _insert(conn, OrderItem.__table__, item_batch, batch_size)
+    _reset_sequences(conn, [Category, Product, User, Wishlist, Order, OrderItem])
+    return counts
@@ -0,0 +1,286 @@
+import copy
+import logging
+import random
+import secrets
+from datetime import datetime, timedelta
+from flask.sessions import SessionInterface, SessionMixin, session_json_serializer
+from itsdangerous import Signer, BadSignature
+from werkzeug.datastructures import CallbackDict
+from werkzeug.exceptions import HTTPException
+from app import db
+from models import ServerSession
+
+logger = logging.getLogger(__name__)
+
+
+class ServerSideSession(CallbackDict, SessionMixin):
+    """Session whose data lives server-side; behaves like Flask's cookie session"""
+
+    def __init__(self, initial=None, sid=None, new=False, expires_at=None):
+        def on_update(self):
+            self.modified = True
+        super().__init__(initial, on_update)
+        self.sid = sid
+        self.new = new
+        self.modified = False
+        self.expires_at = expires_at
+        self.initial_user_id = self.get('_user_id')
+        # What the store held when the request began; saving writes back only the difference
+        self.loaded = copy.deepcopy(dict(self))
+
+    def changes(self):
+        """The keys set or changed during the request, and the keys removed"""
+        changed = {key: value for key, value in self.items()
+                   if key not in self.loaded or self.loaded[key] != value}
+        removed = [key for key in self.loaded if key not in self]
+        return changed, removed
+
+
+class SQLSessionBackend:
+    """Sessions in the application database (the ``sessions`` table)"""
+
+    def __init__(self, engine):
+        self.engine = engine
+        self.table = ServerSession.__table__
+
+    def load(self, sid):
+        with self.engine.connect() as conn:
+            row = conn.execute(
+                db.select(self.table.c.data, self.table.c.expires_at).where(self.table.c.id == sid)
+            ).first()
+        return (row.data, row.expires_at) if row else None
+
+    def save(self, sid, data, expires_at):
+        # A separate transaction, so saving the session never commits the view's ORM work
+        with self.engine.begin() as conn:
+            result = conn.execute(
+                self.table.update().where(self.table.c.id == sid)
+                          .values(data=data, expires_at=expires_at)
+            )
+            if result.rowcount == 0:
+                conn.execute(self.table.insert().values(id=sid, data=data, expires_at=expires_at))
+
+    def update(self, sid, merge, expires_at):
+        # Read and write in one transaction, so keys another request saved meanwhile survive
+        with self.engine.begin() as conn:
+            row = conn.execute(
+                db.select(self.table.c.data).where(self.table.c.id == sid).with_for_update()
+            ).first()
+            data = merge(row.data if row else None)
+            if row:
+                conn.execute(self.table.update().where(self.table.c.id == sid)
+                                                .values(data=data, expires_at=expires_at))
+            else:
+                conn.execute(self.table.insert().values(id=sid, data=data, expires_at=expires_at))
+
+    def touch(self, sid, expires_at):
+        with self.engine.begin() as conn:
+            conn.execute(self.table.update().where(self.table.c.id == sid).values(expires_at=expires_at))
+
+    def delete(self, sid):
+        with self.engine.begin() as conn:
+            conn.execute(self.table.delete().where(self.table.c.id == sid))
+
+    def sweep(self, now):
+        with self.engine.begin() as conn:
+            return conn.execute(self.table.delete().where(self.table.c.expires_at < now)).rowcount
+
+
+class RedisSessionBackend:
+    """Sessions in a key-value store; Redis expires keys itself, so sweeping is a no-op"""
+
+    prefix = 'session:'
+
+    def __init__(self, url):
+        try:
+            import redis
+        except ImportError:
+            raise RuntimeError('SESSION_REDIS_URL is set but the redis package is not installed')
+        self.client = redis.Redis.from_url(url)
+
+    def load(self, sid):
+        data = self.client.get(self.prefix + sid)
+        if data is None:
+            return None
+        ttl = self.client.ttl(self.prefix + sid)
+        return data.decode(), datetime.utcnow() + timedelta(seconds=max(ttl, 0))
+
+    def save(self, sid, data, expires_at):
+        ttl = max(int((expires_at - datetime.utcnow()).total_seconds()), 1)
+        self.client.set(self.prefix + sid, data, ex=ttl)
+
+    def update(self, sid, merge, expires_at):
+        key = self.prefix + sid
+        ttl = max(int((expires_at - datetime.utcnow()).total_seconds()), 1)
+
+        def apply(pipe):
+            stored = pipe.get(key)
+            data = merge(stored.decode() if stored is not None else None)
+            pipe.multi()
+            pipe.set(key, data, ex=ttl)
+        # WATCH the key, so a concurrent save makes this one retry on fresh data
+        self.client.transaction(apply, key)
+
+    def touch(self, sid, expires_at):
+        ttl = max(int((expires_at - datetime.utcnow()).total_seconds()), 1)
+        self.client.expire(self.prefix + sid, ttl)
+
+    def delete(self, sid):
+        self.client.delete(self.prefix + sid)
+
+    def sweep(self, now):
+        return 0
+
+
+class ServerSideSessionInterface(SessionInterface):
+    """Keep session data server-side and only a signed session id in the cookie.
+
+    Requests without a session cookie, and requests for ``skip_endpoints``
+    such as static files, never touch the store. Unchanged sessions are not
+    rewritten, changed ones only write back the keys the request changed,
+    and the expiry is slid forward only once half of the session lifetime
+    has passed.
+    """
+
+    serializer = session_json_serializer
+    session_class = ServerSideSession
+
+    def __init__(self, backend, sweep_probability=0.0, skip_endpoints=()):
+        self.backend = backend
+        self.sweep_probability = sweep_probability
+        self.skip_endpoints = frozenset(skip_endpoints)
+
+    def _signer(self, app):
+        return Signer(app.secret_key, salt='server-side-session')
+
+    def _lifetime(self, app):
+        return app.permanent_session_lifetime
+
+    def _skips_store(self, app, request):
+        if not self.skip_endpoints:
+            return False
+        # Flask opens the session before it matches the URL, so match it here
+        try:
+            endpoint, _ = app.create_url_adapter(request).match()
+        except HTTPException:
+            return False
+        return endpoint in self.skip_endpoints
+
+    def open_session(self, app, request):
+        cookie = request.cookies.get(self.get_cookie_name(app))
+        if not cookie:
+            return self.session_class(sid=secrets.token_urlsafe(32), new=True)
+        if self._skips_store(app, request):
+            # An empty session that is never saved, so the stored one is left as it is
+            return self.session_class()
+        try:
+            sid = self._signer(app).unsign(cookie).decode()
+        except BadSignature:
+            return self.session_class(sid=secrets.token_urlsafe(32), new=True)
+
+        stored = self.backend.load(sid)
+        if stored is None or stored[1] < datetime.utcnow():
+            return self.session_class(sid=secrets.token_urlsafe(32), new=True)
+        data, expires_at = stored
+        try:
+            initial = self.serializer.loads(data)
+        except ValueError:
+            initial = {}
+        return self.session_class(initial, sid=sid, expires_at=expires_at)
+
+    def save_session(self, app, session, response):
+        name = self.get_cookie_name(app)
+        domain = self.get_cookie_domain(app)
+        path = self.get_cookie_path(app)
+        now = datetime.utcnow()
+
+        if session.sid is None:
+            return
+
+        if self.sweep_probability and random.random() < self.sweep_probability:
+            self.sweep()
+
+        if not session:
+            if session.modified and not session.new:
+                self.backend.delete(session.sid)
+                response.delete_cookie(name, domain=domain, path=path,
+                                       secure=self.get_cookie_secure(app),
+                                       samesite=self.get_cookie_samesite(app),
+                                       httponly=self.get_cookie_httponly(app))
+            return
+
+        response.vary.add('Cookie')
+        expires_at = now + self._lifetime(app)
+
+        # A new login gets a new session id, so a planted id cannot be reused
+        if not session.new and session.get('_user_id') != session.initial_user_id:
+            self.backend.delete(session.sid)
+            session.sid = secrets.token_urlsafe(32)
+            session.new = True
+
+        changed, removed = session.changes()
+        if session.new:
+            self.backend.save(session.sid, self.serializer.dumps(dict(session)), expires_at)
+        elif changed or removed:
+            self.backend.update(session.sid, self._merge(changed, removed), expires_at)
+        elif session.expires_at and session.expires_at - now < self._lifetime(app) / 2:
+            self.backend.touch(session.sid, expires_at)
+        else:
+            return
+
+        response.set_cookie(
+            name,
+            self._signer(app).sign(session.sid.encode()).decode(),
+            expires=self.get_expiration_time(app, session),
+            httponly=self.get_cookie_httponly(app),
+            domain=domain,
+            path=path,
+            secure=self.get_cookie_secure(app),
+            samesite=self.get_cookie_samesite(app),
+        )
+
+    def _merge(self, changed, removed):
+        # Applied to what the store holds now rather than what this request
+        # loaded, so a cart poll saving cart_count cannot wipe a shipping_info
+        # that the checkout saved in between
+        def merge(stored):
+            try:
+                data = self.serializer.loads(stored) if stored else {}
+            except ValueError:
+                data = {}
+            data.update(changed)
+            for key in removed:
+                data.pop(key, None)
+            return self.serializer.dumps(data)
+        return merge
+
+    def sweep(self):
+        """Delete expired sessions; returns how many were removed"""
+        try:
+            return self.backend.sweep(datetime.utcnow())
+        except Exception as e:
+            logger.warning(f'Session sweep failed: {e}')
+            return 0
+
+
+def init_app(app, engine):
+    """Install the server-side session interface selected by SESSION_BACKEND.
+
+    ``sql`` (default) stores sessions in the database, ``redis`` in the
+    store at SESSION_REDIS_URL, and ``cookie`` keeps Flask's signed cookie.
+    """
+    backend = app.config.setdefault('SESSION_BACKEND', 'sql')
+    if backend == 'cookie':
+        return
+    if backend == 'redis':
+        store = RedisSessionBackend(app.config['SESSION_REDIS_URL'])
+    else:
+        store = SQLSessionBackend(engine)
+    app.session_interface = ServerSideSessionInterface(
+        store, sweep_probability=app.config.setdefault('SESSION_SWEEP_PROBABILITY', 0.001),
+        skip_endpoints=app.config.setdefault('SESSION_SKIP_ENDPOINTS', ('static', 'image_variant')))
+
+    @app.cli.command('sweep-sessions')
+    def sweep_sessions_command():
+        """Delete expired server-side sessions."""
+        print(f'Removed {app.session_interface.sweep()} expired sessions')
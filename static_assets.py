@@ -0,0 +1,152 @@
+import gzip
+import hashlib
+import json
+import logging
+import mimetypes
+import os
+import re
+from flask import current_app, redirect, request, send_from_directory, url_for
+
+try:
+    import brotli
+except ImportError:  # brotli is optional; gzip siblings are still built and served
+    brotli = None
+
+MANIFEST = 'manifest.json'
+HASH_LENGTH = 12
+IMMUTABLE = 'public, max-age=31536000, immutable'
+COMPRESSIBLE = ('.css', '.js', '.svg', '.json', '.txt', '.html')
+HASHED_NAME = re.compile(r'^(?P<stem>.+)\.(?P<digest>[0-9a-f]{%d})(?P<ext>\.[^./]+)$' % HASH_LENGTH)
+
+logger = logging.getLogger(__name__)
+
+_manifest = {}
+_hashes = {}
+
+
+def _file_hash(path):
+    digest = hashlib.md5()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(65536), b''):
+            digest.update(chunk)
+    return digest.hexdigest()[:HASH_LENGTH]
+
+
+def asset_hash(filename):
+    """Content hash of a static file, from the manifest or (without one) hashed on demand"""
+    if filename in _manifest:
+        return _manifest[filename]
+    path = os.path.join(current_app.static_folder, filename)
+    try:
+        mtime = os.path.getmtime(path)
+    except OSError:
+        return None
+    cached = _hashes.get(filename)
+    if cached is None or cached[0] != mtime:
+        cached = _hashes[filename] = (mtime, _file_hash(path))
+    return cached[1]
+
+
+def hashed_name(filename):
+    stem, ext = os.path.splitext(filename)
+    digest = asset_hash(filename)
+    return f'{stem}.{digest}{ext}' if digest and ext else filename
+
+
+def _fingerprint_static_urls(endpoint, values):
+    # url_for('static', filename='css/x.css') -> /static/css/x.<hash>.css
+    if endpoint == 'static' and 'filename' in values and not HASHED_NAME.match(values['filename']):
+        values['filename'] = hashed_name(values['filename'])
+
+
+def _precompressed(filename):
+    """A fresh .br or .gz sibling of ``filename`` the client accepts, as (name, encoding)"""
+    accepted = request.accept_encodings
+    source = os.path.join(current_app.static_folder, filename)
+    for suffix, encoding in (('.br', 'br'), ('.gz', 'gzip')):
+        if not accepted[encoding]:
+            continue
+        sibling = source + suffix
+        if os.path.isfile(sibling) and os.path.getmtime(sibling) >= os.path.getmtime(source):
+            return filename + suffix, encoding
+    return None, None
+
+
+def serve_static(filename):
+    """Serve static files; fingerprinted names are immutable and may come precompressed"""
+    match = HASHED_NAME.match(filename)
+    if match is None:
+        return current_app.send_static_file(filename)
+
+    original = match['stem'] + match['ext']
+    if asset_hash(original) != match['digest']:
+        # A page from before the last deploy: point it at the current version
+        return redirect(url_for('static', filename=original))
+
+    compressed, encoding = _precompressed(original)
+    response = send_from_directory(current_app.static_folder, compressed or original)
+    if encoding:
+        response.headers['Content-Encoding'] = encoding
+        response.mimetype = mimetypes.guess_type(original)[0] or 'application/octet-stream'
+    response.vary.add('Accept-Encoding')
+    response.headers['Cache-Control'] = IMMUTABLE
+    return response
+
+
+def build(static_folder):
+    """Hash every static file into the manifest and write .gz/.br siblings of text assets"""
+    manifest = {}
+    for root, _, files in os.walk(static_folder):
+        for name in files:
+            path = os.path.join(root, name)
+            filename = os.path.relpath(path, static_folder).replace(os.sep, '/')
+            if filename == MANIFEST or name.endswith(('.gz', '.br')):
+                continue
+            manifest[filename] = _file_hash(path)
+            if name.endswith(COMPRESSIBLE):
+                with open(path, 'rb') as f:
+                    data = f.read()
+                with open(path + '.gz', 'wb') as f:
+                    f.write(gzip.compress(data, compresslevel=9, mtime=0))
+                if brotli is not None:
+                    with open(path + '.br', 'wb') as f:
+                        f.write(brotli.compress(data, quality=11))
+    with open(os.path.join(static_folder, MANIFEST), 'w') as f:
+        json.dump(manifest, f, indent=1, sort_keys=True)
+    return manifest
+
+
+def init_app(app):
+    """Fingerprint url_for('static') URLs and serve them with far-future caching.
+
+    ``flask build-assets`` (run when the release is built) writes the
+    manifest and the precompressed files; without a manifest, files are
+    hashed on first use and rehashed when they change, and outside debug
+    mode the missing build is logged as an error at startup.
+    """
+    global _manifest
+    path = os.path.join(app.static_folder, MANIFEST)
+    # In debug mode files change under a built manifest, so always hash on demand
+    if app.debug:
+        pass
+    elif os.path.exists(path):
+        with open(path) as f:
+            _manifest = json.load(f)
+    else:
+        logger.error(f'{path} is missing; run `flask build-assets` when the release is built. '
+                     f'Until then the bundles and precompressed files are not served and '
+                     f'every static file is hashed on first use')
+    app.url_defaults(_fingerprint_static_urls)
+    app.view_functions['static'] = serve_static
+
+    @app.cli.command('build-assets')
+    def build_assets_command():
+        """Subset icons, build the bundles, then fingerprint and precompress static files."""
+        import frontend
+        icons, glyphs = frontend.subset_icons()
+        print(f'Kept {glyphs} icon glyphs for {icons} fa-* names in use')
+        for bundle, sources in frontend.build_bundles().items():
+            print(f'{bundle}: {", ".join(sources)}')
+        manifest = build(app.static_folder)
+        print(f'Fingerprinted {len(manifest)} static files'
+              f'{"" if brotli else " (brotli not installed; gzip only)"}')
@@ -0,0 +1,96 @@
+import os
+import tempfile
+import uuid
+from decimal import Decimal
+import pytest
+
+# The app is configured from the environment when it is imported
+_db_dir = tempfile.mkdtemp(prefix='havencraft-tests-')
+os.environ['DATABASE_URL'] = f'sqlite:///{os.path.join(_db_dir, "test.db")}'
+os.environ['AUTO_CREATE_SCHEMA'] = 'true'
+os.environ['PASSWORD_HASH_METHOD'] = 'pbkdf2:sha256:1000'  # fast hashes; the method is not under test
+os.environ['METRICS_ENABLED'] = 'true'
+os.environ['METRICS_TOKEN'] = 'test-metrics-token'
+
+from app import app as flask_app, db, initialize_database  # noqa: E402
+from models import Order, OrderItem, Product, User  # noqa: E402
+import ratelimit  # noqa: E402
+
+PASSWORD = 'secret123'
+
+
+@pytest.fixture(scope='session')
+def app():
+    flask_app.testing = True
+    initialize_database(seed=True)
+    return flask_app
+
+
+@pytest.fixture(autouse=True)
+def _fresh_rate_limits(app):
+    # Every test logs in from 127.0.0.1; only the rate limit tests should hit the limits
+    ratelimit._store = ratelimit.MemoryStore()
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+def make_user(app):
+    """A new account with PASSWORD; returns its id and email"""
+    with app.app_context():
+        name = uuid.uuid4().hex[:10]
+        account = User(username=name, email=f'{name}@example.com', first_name='Test', last_name='User')
+        account.set_password(PASSWORD)
+        db.session.add(account)
+        db.session.commit()
+        return {'id': account.id, 'email': account.email}
+
+
+@pytest.fixture
+def user(app):
+    return make_user(app)
+
+
+def login(client, user):
+    response = client.post('/login', data={'email': user['email'], 'password': PASSWORD})
+    assert response.status_code == 302
+    return response
+
+
+@pytest.fixture
+def logged_in(client, user):
+    login(client, user)
+    return client
+
+
+def create_order(user_id, products=2, quantity=1, status='confirmed'):
+    """An order with one line for each of the first ``products`` products; returns its id"""
+    items = Product.query.order_by(Product.id).limit(products).all()
+    order = Order(user_id=user_id, status=status, shipping_address='1 Test Street', payment_method='cash_on_delivery',
+                  total_amount=sum((item.price * quantity for item in items), Decimal('0')))
+    order.items = [OrderItem(product_id=item.id, quantity=quantity, price=item.price) for item in items]
+    db.session.add(order)
+    db.session.commit()
+    return order.id
+
+
+def set_stock(product_id, quantity):
+    Product.query.filter_by(id=product_id).update({'stock_quantity': quantity})
+    db.session.commit()
+
+
+def get_stock(product_id):
+    db.session.expire_all()
+    return db.session.get(Product, product_id).stock_quantity
+
+
+SHIPPING = {'full_name': 'Test User', 'address_line1': '1 Test Street', 'city': 'Springfield',
+            'state': 'IL', 'postal_code': '62701', 'country': 'US'}
+
+
+def fill_checkout(client, **payment):
+    """Post the shipping and payment steps; the cart must already hold something"""
+    client.post('/checkout/shipping', data=SHIPPING)
+    client.post('/checkout/payment', data=payment or {'payment_method': 'cash_on_delivery'})
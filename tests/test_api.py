@@ -0,0 +1,62 @@
+from decimal import Decimal
+import pytest
+from app import db
+from models import Category, Product
+
+
+def _set_price(product_id, price):
+    # A plain UPDATE, as a script or another service would issue: no ORM events fire
+    db.session.execute(Product.__table__.update().where(Product.__table__.c.id == product_id)
+                       .values(price=price))
+    db.session.commit()
+
+
+@pytest.mark.parametrize('query', ['ids=5,6,7&fields=price', 'fields=price&per_page=50'])
+def test_price_change_from_elsewhere_is_not_revalidated(app, client, query):
+    first = client.get(f'/api/products?{query}')
+    etag = first.headers['ETag']
+    assert first.headers['Cache-Control'] == 'public, no-cache'
+    assert client.get(f'/api/products?{query}', headers={'If-None-Match': etag}).status_code == 304
+
+    with app.app_context():
+        _set_price(6, Decimal('12.34'))
+    response = client.get(f'/api/products?{query}', headers={'If-None-Match': etag})
+    assert response.status_code == 200
+    assert response.headers['ETag'] != etag
+    assert {'id': 6, 'price': '12.34'} in response.get_json()['products']
+
+
+def test_batch_keeps_the_requested_order(client):
+    products = client.get('/api/products?ids=3,1,2&fields=name').get_json()['products']
+    assert [product['id'] for product in products] == [3, 1, 2]
+    assert set(products[0]) == {'id', 'name'}
+
+
+def test_listing_pages_follow_the_cursor(client):
+    first = client.get('/api/products?per_page=5&sort=price_asc').get_json()
+    second = client.get(first['next']).get_json()
+    prices = [Decimal(p['price']) for p in first['products'] + second['products']]
+    assert len(prices) == 10 and prices == sorted(prices)
+
+
+@pytest.mark.parametrize('query, message', [
+    ('fields=name,secret', 'Unknown fields: secret'),
+    ('ids=1,two', 'ids must be'),
+    ('ids=' + ','.join(map(str, range(101))), 'At most 100 ids'),
+    ('sort=sideways', 'sort must be one of'),
+])
+def test_bad_requests_are_answered_with_400(client, query, message):
+    response = client.get(f'/api/products?{query}')
+    assert response.status_code == 400
+    assert message in response.get_json()['error']
+
+
+def test_categories_revalidate_until_a_category_changes(app, client):
+    etag = client.get('/api/categories').headers['ETag']
+    assert client.get('/api/categories', headers={'If-None-Match': etag}).status_code == 304
+    with app.app_context():
+        db.session.add(Category(name='Basketry'))
+        db.session.commit()
+    response = client.get('/api/categories', headers={'If-None-Match': etag})
+    assert response.status_code == 200
+    assert 'Basketry' in [category['name'] for category in response.get_json()['categories']]
@@ -0,0 +1,59 @@
+import os
+import subprocess
+import sys
+from conftest import create_order, make_user, set_stock
+from app import db
+from catalog_cache import catalog_version, get_categories
+from instrumentation import assert_max_queries
+from models import Category, Order
+
+WORKER = """
+from app import app, db
+from order_events import sync_inventory
+with app.app_context():
+    sync_inventory({order_id})
+    db.session.commit()
+"""
+
+
+def test_categories_are_read_once_per_catalog_version(app):
+    with app.app_context():
+        get_categories()
+        with assert_max_queries(1) as statements:
+            categories = get_categories()
+        assert not any('FROM category' in statement for statement in statements)
+    assert 'Jewelry' in [category['name'] for category in categories]
+
+
+def test_committed_category_edit_invalidates_the_cache(app):
+    with app.app_context():
+        before = catalog_version()
+        get_categories()
+        db.session.add(Category(name='Glasswork', description='Blown glass'))
+        db.session.commit()
+        assert catalog_version() != before
+        assert 'Glasswork' in [category['name'] for category in get_categories()]
+
+
+def test_rolled_back_edit_keeps_the_cache(app):
+    with app.app_context():
+        before = catalog_version()
+        db.session.add(Category(name='Never saved'))
+        db.session.flush()
+        db.session.rollback()
+        assert catalog_version() == before
+        assert 'Never saved' not in [category['name'] for category in get_categories()]
+
+
+def test_worker_sell_out_reaches_the_web_process(app, client):
+    # The job runs in its own process, as under `flask worker`
+    with app.app_context():
+        order_id = create_order(make_user(app)['id'], products=1)
+        product_id = db.session.get(Order, order_id).items[0].product_id
+        set_stock(product_id, 0)
+    client.get('/')
+    assert client.get('/').headers['X-Cache'] == 'HIT'
+
+    subprocess.run([sys.executable, '-c', WORKER.format(order_id=order_id)], check=True,
+                   cwd=os.path.dirname(os.path.dirname(__file__)), capture_output=True)
+    assert client.get('/').headers['X-Cache'] == 'MISS'
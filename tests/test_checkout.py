@@ -0,0 +1,54 @@
+import re
+from conftest import fill_checkout, get_stock, login, make_user, set_stock
+from models import Order
+
+
+def _confirmation_key(client):
+    page = client.get('/checkout/confirmation').get_data(as_text=True)
+    return re.search(r'name="idempotency_key" value="([^"]+)"', page).group(1)
+
+
+def _order_count(app, user):
+    with app.app_context():
+        return Order.query.filter_by(user_id=user['id']).count()
+
+
+def test_resubmitting_the_confirmation_places_one_order(app, logged_in, user):
+    with app.app_context():
+        set_stock(20, 5)
+    logged_in.post('/add_to_cart', data={'product_id': 20, 'quantity': 2})
+    fill_checkout(logged_in)
+    key = _confirmation_key(logged_in)
+
+    first = logged_in.post('/checkout/confirmation', data={'idempotency_key': key})
+    second = logged_in.post('/checkout/confirmation', data={'idempotency_key': key})
+    assert '/order/success/' in first.location
+    assert second.location == first.location
+    assert _order_count(app, user) == 1
+    with app.app_context():
+        assert get_stock(20) == 3
+
+
+def test_a_new_checkout_gets_a_new_key(app, logged_in, user):
+    for _ in range(2):
+        logged_in.post('/add_to_cart', data={'product_id': 21, 'quantity': 1})
+        fill_checkout(logged_in)
+        key = _confirmation_key(logged_in)
+        logged_in.post('/checkout/confirmation', data={'idempotency_key': key})
+    assert _order_count(app, user) == 2
+
+
+def test_another_users_key_does_not_reveal_their_order(app, client, user):
+    other = make_user(app)
+    login(client, other)
+    client.post('/add_to_cart', data={'product_id': 22, 'quantity': 1})
+    fill_checkout(client)
+    key = _confirmation_key(client)
+    placed = client.post('/checkout/confirmation', data={'idempotency_key': key}).location
+
+    client.get('/logout')
+    login(client, user)
+    response = client.post('/checkout/confirmation', data={'idempotency_key': key})
+    assert response.location != placed
+    assert '/checkout' in response.location
+    assert _order_count(app, user) == 0
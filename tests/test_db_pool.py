@@ -0,0 +1,21 @@
+import pytest
+import db_pool
+
+SERVER = 'postgresql://shop@db.example.com/havencraft'
+
+
+def test_null_pool_for_an_external_pooler():
+    options = db_pool.engine_options({'SQLALCHEMY_DATABASE_URI': SERVER, 'DB_POOL': 'null'})
+    assert options == {'poolclass': db_pool.TimedNullPool}
+
+
+def test_queue_pool_by_default():
+    options = db_pool.engine_options({'SQLALCHEMY_DATABASE_URI': SERVER})
+    assert options['poolclass'] is db_pool.TimedQueuePool
+    assert options['pool_size'] == db_pool.PROFILES['sync']['pool_size']
+
+
+@pytest.mark.parametrize('pool', ['nul', 'NullPool', ''])
+def test_unknown_pool_is_rejected(pool):
+    with pytest.raises(ValueError, match='DB_POOL'):
+        db_pool.engine_options({'SQLALCHEMY_DATABASE_URI': SERVER, 'DB_POOL': pool})
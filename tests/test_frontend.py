@@ -0,0 +1,26 @@
+import os
+import re
+from frontend import FONT_FAMILIES, FONTS_CSS, _font_files
+
+
+def _vendored(app, family):
+    return all(os.path.isfile(os.path.join(app.static_folder, name))
+               for name, face in _font_files().items() if face[0] == family)
+
+
+def test_only_fonts_not_vendored_load_from_google(app, client):
+    html = client.get('/').get_data(as_text=True)
+    assert 'fonts.gstatic.com' not in html
+    for family in FONT_FAMILIES:
+        from_google = f'fonts.googleapis.com/css2?family={family.replace(" ", "+")}:' in html
+        assert from_google != _vendored(app, family), family
+    assert _vendored(app, 'Inter')
+
+
+def test_every_vendored_font_face_is_committed(app):
+    fonts_css = os.path.join(app.static_folder, FONTS_CSS)
+    with open(fonts_css, encoding='utf-8') as f:
+        files = re.findall(r'url\(([^)]+)\)', f.read())
+    assert files
+    for name in files:
+        assert os.path.isfile(os.path.join(os.path.dirname(fonts_css), name)), name
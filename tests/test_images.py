@@ -0,0 +1,16 @@
+import threading
+import images
+
+
+def test_missing_variant_is_built_off_the_request_thread(client, monkeypatch, tmp_path):
+    monkeypatch.setattr(images, '_variant_dir', str(tmp_path))
+    threads = []
+    build = images.build_variant
+    monkeypatch.setattr(images, 'build_variant',
+                        lambda url, width: threads.append(threading.current_thread()) or build(url, width))
+
+    response = client.get('/images/160/images/products/alpaca-wool-blanket.webp')
+    assert response.status_code == 200
+    assert response.mimetype == 'image/webp'
+    assert threads and threads[0] is not threading.current_thread()
+    assert (tmp_path / 'images' / 'products' / 'alpaca-wool-blanket-160w.webp').is_file()
@@ -0,0 +1,89 @@
+import pytest
+from conftest import fill_checkout, get_stock, set_stock
+from app import db
+from cart_service import add_item, set_quantity
+from inventory import OutOfStock, release_stock, reserve_stock
+from models import Cart, Order
+
+
+def test_reserve_takes_stock_for_every_line(app):
+    with app.app_context():
+        set_stock(10, 5)
+        set_stock(11, 5)
+        reserve_stock([(10, 2), (11, 1), (10, 1)])
+        db.session.commit()
+        assert (get_stock(10), get_stock(11)) == (2, 4)
+
+
+def test_short_line_raises_and_rollback_restores_the_others(app):
+    with app.app_context():
+        set_stock(10, 5)
+        set_stock(11, 1)
+        with pytest.raises(OutOfStock) as excinfo:
+            reserve_stock([(10, 2), (11, 3)])
+        db.session.rollback()
+        assert excinfo.value.product_ids == [11]
+        assert (get_stock(10), get_stock(11)) == (5, 1)
+
+
+@pytest.mark.parametrize('quantity', [0, -4])
+def test_non_positive_quantities_are_rejected(app, quantity):
+    with app.app_context():
+        set_stock(12, 7)
+        with pytest.raises(ValueError):
+            reserve_stock([(12, quantity)])
+        with pytest.raises(ValueError):
+            release_stock([(12, quantity)])
+        db.session.rollback()
+        assert get_stock(12) == 7
+
+
+def test_cart_service_rejects_non_positive_quantities(app, user):
+    with app.test_request_context():
+        cart = Cart(user_id=user['id'])
+        db.session.add(cart)
+        db.session.flush()
+        add_item(cart, 12, 2)
+        with pytest.raises(ValueError):
+            add_item(cart, 12, -4)
+        with pytest.raises(ValueError):
+            set_quantity(cart, 12, 0)
+        db.session.rollback()
+
+
+def test_negative_add_to_cart_cannot_put_stock_back(app, logged_in):
+    with app.app_context():
+        set_stock(13, 7)
+    response = logged_in.post('/add_to_cart', data={'product_id': 13, 'quantity': -4}, follow_redirects=True)
+    assert 'Quantity must be at least 1' in response.get_data(as_text=True)
+    assert logged_in.get('/api/cart').get_json() == {}
+    with app.app_context():
+        assert get_stock(13) == 7
+
+
+def test_update_cart_rejects_negative_and_removes_zero(app, logged_in):
+    logged_in.post('/add_to_cart', data={'product_id': 14, 'quantity': 2})
+    logged_in.post('/add_to_cart', data={'product_id': 15, 'quantity': 1})
+    response = logged_in.post('/update_cart', data={'quantity_14': -3}, follow_redirects=True)
+    assert 'Quantities cannot be negative' in response.get_data(as_text=True)
+    logged_in.post('/update_cart', data={'quantity_14': 3, 'quantity_15': 0})
+    assert logged_in.get('/api/cart').get_json() == {'14': 3}
+
+
+def test_checkout_takes_stock_and_stops_when_short(app, logged_in):
+    with app.app_context():
+        set_stock(16, 3)
+        orders_before = Order.query.count()
+    logged_in.post('/add_to_cart', data={'product_id': 16, 'quantity': 2})
+    fill_checkout(logged_in)
+    assert '/order/success/' in logged_in.post('/checkout/confirmation').location
+    with app.app_context():
+        assert get_stock(16) == 1
+
+    logged_in.post('/add_to_cart', data={'product_id': 16, 'quantity': 2})
+    fill_checkout(logged_in)
+    response = logged_in.post('/checkout/confirmation')
+    assert response.location.endswith('/cart')
+    with app.app_context():
+        assert get_stock(16) == 1
+        assert Order.query.count() == orders_before + 1
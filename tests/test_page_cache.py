@@ -0,0 +1,59 @@
+from conftest import fill_checkout, set_stock
+from app import db
+
+
+def test_anonymous_pages_are_served_from_the_cache(client):
+    assert client.get('/about').headers['X-Cache'] == 'MISS'
+    response = client.get('/about')
+    assert response.headers['X-Cache'] == 'HIT'
+    assert client.get('/about', headers={'If-None-Match': response.headers['ETag']}).status_code == 304
+
+
+def test_logged_in_visitors_bypass_the_cache(logged_in):
+    logged_in.get('/about')
+    assert 'X-Cache' not in logged_in.get('/about').headers
+
+
+def test_checkout_retires_cached_product_pages(app, logged_in):
+    client = app.test_client()
+    with app.app_context():
+        set_stock(17, 5)
+    client.get('/product/17')
+    assert 'In Stock (5 available)' in client.get('/product/17').get_data(as_text=True)
+
+    logged_in.post('/add_to_cart', data={'product_id': 17, 'quantity': 3})
+    fill_checkout(logged_in)
+    logged_in.post('/checkout/confirmation')
+
+    response = client.get('/product/17')
+    assert response.headers['X-Cache'] == 'MISS'
+    assert 'In Stock (2 available)' in response.get_data(as_text=True)
+
+
+def test_orders_leave_other_cached_pages_alone(app, logged_in):
+    client = app.test_client()
+    for path in ('/about', '/', '/products', '/product/19', '/product/18'):
+        client.get(path)
+        assert client.get(path).headers['X-Cache'] == 'HIT'
+
+    logged_in.post('/add_to_cart', data={'product_id': 18, 'quantity': 1})
+    fill_checkout(logged_in)
+    logged_in.post('/checkout/confirmation')
+
+    for path in ('/about', '/', '/products', '/product/19'):
+        assert client.get(path).headers['X-Cache'] == 'HIT', path
+    assert client.get('/product/18').headers['X-Cache'] == 'MISS'
+
+
+def test_writes_outside_sqlalchemy_retire_the_product_page(app):
+    client = app.test_client()
+    client.get('/product/3')
+    assert client.get('/product/3').headers['X-Cache'] == 'HIT'
+
+    with app.app_context():
+        db.session.execute(db.text('UPDATE product SET stock_quantity = 4 WHERE id = 3'))
+        db.session.commit()
+
+    response = client.get('/product/3')
+    assert response.headers['X-Cache'] == 'MISS'
+    assert 'In Stock (4 available)' in response.get_data(as_text=True)
@@ -0,0 +1,69 @@
+import uuid
+import pytest
+from conftest import create_order, login
+from app import db
+from models import User
+from instrumentation import QueryBudgetExceeded, assert_max_queries
+
+# Every logged-in request also reads its session row, loads the user, counts the
+# cart for the header badge and writes the session back
+REQUEST_OVERHEAD = 4
+
+
+@pytest.fixture
+def orders(app, user):
+    with app.app_context():
+        return [create_order(user['id'], products=3, quantity=2) for _ in range(5)]
+
+
+@pytest.mark.parametrize('path, budget', [
+    ('/order/success/{order_id}', 4),
+    ('/order/{order_id}', 4),
+    ('/user/profile', 3),
+    ('/profile/orders', 4),
+])
+def test_order_pages_stay_within_budget(app, logged_in, orders, path, budget):
+    with app.app_context():
+        with assert_max_queries(budget + REQUEST_OVERHEAD, path):
+            response = logged_in.get(path.format(order_id=orders[-1]))
+    assert response.status_code == 200
+
+
+def test_order_history_query_count_does_not_grow_with_orders(app, logged_in, user, orders):
+    with app.app_context():
+        logged_in.get('/profile/orders')
+        with assert_max_queries(100) as before:
+            logged_in.get('/profile/orders')
+        for _ in range(5):
+            create_order(user['id'], products=4)
+        with assert_max_queries(100) as after:
+            response = logged_in.get('/profile/orders')
+    assert response.status_code == 200
+    assert len(after) == len(before)
+
+
+def test_orders_of_other_users_are_not_found(app, client, user):
+    with app.app_context():
+        other = User(username=uuid.uuid4().hex[:10], email=f'{uuid.uuid4().hex[:10]}@example.com')
+        db.session.add(other)
+        db.session.commit()
+        order_id = create_order(other.id)
+    login(client, user)
+    assert client.get(f'/order/{order_id}').status_code == 404
+    assert client.get(f'/order/success/{order_id}').status_code == 404
+
+
+def test_assert_max_queries_reports_every_statement(app):
+    with app.app_context():
+        with pytest.raises(QueryBudgetExceeded, match='issued 2 queries \\(budget 1\\)'):
+            with assert_max_queries(1, 'two selects'):
+                db.session.execute(db.text('SELECT 1'))
+                db.session.execute(db.text('SELECT 2'))
+
+
+def test_metrics_require_the_bearer_token(client):
+    assert client.get('/metrics').status_code == 401
+    assert client.get('/metrics', headers={'Authorization': 'Bearer wrong'}).status_code == 401
+    response = client.get('/metrics', headers={'Authorization': 'Bearer test-metrics-token'})
+    assert response.status_code == 200
+    assert 'havencraft_db_queries_total' in response.get_data(as_text=True)
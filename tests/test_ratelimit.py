@@ -0,0 +1,66 @@
+import pytest
+from conftest import PASSWORD, login
+import ratelimit
+
+
+def _login(client, email, password='wrong-password', ip='203.0.113.7'):
+    return client.post('/login', data={'email': email, 'password': password},
+                       environ_base={'REMOTE_ADDR': ip})
+
+
+def test_repeated_logins_for_one_email_are_limited(client, user):
+    for _ in range(5):
+        assert _login(client, user['email']).status_code != 429
+    response = _login(client, user['email'])
+    assert response.status_code == 429
+    assert int(response.headers['Retry-After']) >= 1
+
+
+def test_only_failed_passwords_count_toward_the_email_limit(app, user):
+    for _ in range(6):
+        assert _login(app.test_client(), user['email'], password=PASSWORD).status_code == 302
+
+
+def test_failures_from_another_address_do_not_lock_the_owner_out(client, user):
+    for _ in range(10):
+        _login(client, user['email'])
+    assert _login(client, user['email'], password=PASSWORD).status_code == 429
+    assert _login(client, user['email'], password=PASSWORD, ip='198.51.100.9').status_code == 302
+
+
+def test_limit_is_per_email_and_per_address(client, user):
+    for _ in range(5):
+        _login(client, 'someone@example.com')
+    assert _login(client, 'someone@example.com').status_code == 429
+    assert _login(client, user['email'], password=PASSWORD).status_code == 302
+    assert _login(client, 'someone@example.com', ip='198.51.100.9').status_code != 429
+    assert _login(client, 'other@example.com', ip='198.51.100.9').status_code != 429
+
+
+def test_only_posts_count(client):
+    for _ in range(30):
+        assert client.get('/login').status_code == 200
+
+
+def test_registrations_are_limited_per_address(client):
+    for n in range(6):
+        response = client.post('/register', data={'username': f'rl{n}', 'email': 'not-an-email'},
+                               environ_base={'REMOTE_ADDR': '192.0.2.1'})
+    assert response.status_code == 429
+
+
+def test_disabled_limiter_lets_everything_through(client, user, monkeypatch):
+    monkeypatch.setattr(ratelimit, '_enabled', False)
+    for _ in range(10):
+        assert _login(client, user['email']).status_code != 429
+    login(client, user)
+
+
+@pytest.mark.parametrize('previous, current, elapsed', [(0, 5, 10), (5, 0, 30), (5, 4, 59)])
+def test_retry_after_brings_the_estimate_under_the_limit(previous, current, elapsed):
+    window, limit = 60, 5
+    wait = ratelimit._retry_after(previous, current, elapsed, window, limit)
+    later = elapsed + wait
+    if later >= window:
+        previous, current, later = current, 0, later - window
+    assert ratelimit._estimate(previous, current, later, window) + 1 <= limit + 1e-9
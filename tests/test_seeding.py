@@ -0,0 +1,39 @@
+from sqlalchemy import func, select, text
+from app import db
+from models import Category, Order, OrderItem, Product, User, Wishlist
+from seeding import seed_synthetic
+
+TABLES = {'category': Category, 'product': Product, 'user': User, 'wishlists': Wishlist,
+          'orders': Order, 'order_items': OrderItem}
+
+
+def _row_counts(conn):
+    return {name: conn.execute(select(func.count()).select_from(model)).scalar()
+            for name, model in TABLES.items()}
+
+
+def test_seed_synthetic_appends_the_rows_it_reports(app):
+    with app.app_context(), db.engine.connect() as conn:
+        transaction = conn.begin()
+        try:
+            before = _row_counts(conn)
+            counts = seed_synthetic(conn, products=40, users=6, orders=15, categories=3, batch_size=7)
+            after = _row_counts(conn)
+
+            assert (counts['category'], counts['product'], counts['user'], counts['orders']) == (3, 40, 6, 15)
+            assert counts['wishlists'] > 0 and counts['order_items'] >= 15
+            assert {name: after[name] - before[name] for name in TABLES} == counts
+
+            # The denormalized wishlist counts match the rows
+            wishlisted = select(func.count()).where(Wishlist.user_id == User.id).scalar_subquery()
+            assert conn.execute(select(func.count()).select_from(User)
+                                .where(User.wishlist_count != wishlisted)).scalar() == 0
+
+            # The FTS index was kept in step by its triggers
+            conn.execute(text("INSERT INTO product_fts(product_fts) VALUES ('integrity-check')"))
+            newest = conn.execute(select(Product.id, Product.name).order_by(Product.id.desc())).first()
+            found = conn.execute(text('SELECT rowid FROM product_fts WHERE product_fts MATCH :name'),
+                                 {'name': f'"{newest.name}"'}).scalars().all()
+            assert found == [newest.id]
+        finally:
+            transaction.rollback()
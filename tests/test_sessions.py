@@ -0,0 +1,86 @@
+from flask import request
+from conftest import fill_checkout, login
+from app import db
+from models import Order, ServerSession
+
+CARD = {'payment_method': 'credit_card', 'card_name': 'Test User', 'card_number': '4111 1111 1111 1234',
+        'expiry_month': '12', 'expiry_year': '2030', 'cvv': '987'}
+
+
+def _session_cookie(client):
+    return client.get_cookie('session')
+
+
+def _stored_sessions(app):
+    with app.app_context():
+        return {row.id: row.data for row in ServerSession.query.all()}
+
+
+def test_cookie_carries_only_a_signed_id(app, client, user):
+    login(client, user)
+    cookie = _session_cookie(client)
+    sid = cookie.value.rsplit('.', 1)[0]
+    assert f'"{user["id"]}"' in _stored_sessions(app)[sid]
+    assert user['email'] not in cookie.value
+    assert client.get('/user/profile').status_code == 200
+
+
+def test_tampered_cookie_starts_a_new_session(app, client, user):
+    login(client, user)
+    cookie = _session_cookie(client)
+    sid, signature = cookie.value.rsplit('.', 1)
+    client.set_cookie('session', f'{sid}x.{signature}')
+    response = client.get('/user/profile')
+    assert response.status_code == 302
+    assert '/login' in response.location
+
+
+def test_login_rotates_the_session_id(app, client, user):
+    client.post('/add_to_cart', data={'product_id': 1, 'quantity': 1})
+    before = _session_cookie(client).value
+    login(client, user)
+    assert _session_cookie(client).value != before
+    assert before.rsplit('.', 1)[0] not in _stored_sessions(app)
+
+
+def test_card_details_never_reach_the_session_store(app, logged_in):
+    logged_in.post('/add_to_cart', data={'product_id': 2, 'quantity': 1})
+    fill_checkout(logged_in, **CARD)
+    stored = ''.join(_stored_sessions(app).values())
+    assert '4111' not in stored and '987' not in stored
+    assert '1234' in logged_in.get('/checkout/confirmation').get_data(as_text=True)
+
+    response = logged_in.post('/checkout/confirmation')
+    assert '/order/success/' in response.location
+    with app.app_context():
+        order = db.session.get(Order, int(response.location.rsplit('/', 1)[1]))
+        assert order.payment_method == 'credit_card'
+    with logged_in.session_transaction() as session:
+        assert 'payment_info' not in session and 'shipping_info' not in session
+
+
+def test_static_files_and_images_skip_the_session_store(app, logged_in, monkeypatch):
+    loads = []
+    load = app.session_interface.backend.load
+    monkeypatch.setattr(app.session_interface.backend, 'load', lambda sid: loads.append(sid) or load(sid))
+    logged_in.get('/static/css/modern-style.css')
+    logged_in.get('/images/400/products/missing.jpg')
+    assert loads == []
+    assert logged_in.get('/user/profile').status_code == 200
+    assert len(loads) == 1
+
+
+def test_saving_keeps_keys_another_request_saved(app, logged_in):
+    cookie = _session_cookie(logged_in)
+    interface = app.session_interface
+    with app.test_request_context(headers={'Cookie': f'session={cookie.value}'}):
+        poll = interface.open_session(app, request)
+        checkout = interface.open_session(app, request)
+        checkout['shipping_info'] = {'city': 'Springfield'}
+        interface.save_session(app, checkout, app.response_class())
+        poll['cart_count'] = 3
+        interface.save_session(app, poll, app.response_class())
+
+    stored = interface.serializer.loads(_stored_sessions(app)[cookie.value.rsplit('.', 1)[0]])
+    assert stored['shipping_info'] == {'city': 'Springfield'}
+    assert stored['cart_count'] == 3
@@ -0,0 +1,23 @@
+import json
+from flask import Flask
+import static_assets
+
+
+def _start(static_folder, monkeypatch):
+    errors = []
+    monkeypatch.setattr(static_assets, '_manifest', {})
+    monkeypatch.setattr(static_assets.logger, 'error', errors.append)
+    static_assets.init_app(Flask(__name__, static_folder=str(static_folder)))
+    return errors
+
+
+def test_missing_manifest_is_logged_outside_debug(tmp_path, monkeypatch):
+    errors = _start(tmp_path, monkeypatch)
+    assert len(errors) == 1
+    assert 'flask build-assets' in errors[0]
+
+
+def test_built_manifest_is_loaded(tmp_path, monkeypatch):
+    (tmp_path / static_assets.MANIFEST).write_text(json.dumps({'css/site.css': 'abcdef123456'}))
+    assert _start(tmp_path, monkeypatch) == []
+    assert static_assets._manifest == {'css/site.css': 'abcdef123456'}
@@ -0,0 +1,59 @@
+import secrets
+from flask import session
+from flask_login import UserMixin
+from app import db
+from models import User
+from catalog_cache import LRUCache
+
+REVISION_KEY = '_principal_rev'
+
+_cache = LRUCache(maxsize=1024, ttl=30)
+
+
+class Principal(UserMixin):
+    """Read-only snapshot of a User row; what views and templates read from current_user.
+
+    To change the user, load the row with ``db.session.get(User, current_user.id)``
+    and call invalidate_user() after committing.
+    """
+
+    FIELDS = ('id', 'username', 'email', 'first_name', 'last_name', 'phone', 'created_at', 'wishlist_count')
+
+    def __init__(self, **values):
+        for field in self.FIELDS:
+            object.__setattr__(self, field, values.get(field))
+
+    def __setattr__(self, name, value):
+        raise AttributeError(f'{type(self).__name__} is read-only; change the User row instead')
+
+    get_full_name = User.get_full_name
+
+
+def init_app(app):
+    """Configure the per-worker user cache from USER_CACHE_TTL/SIZE"""
+    global _cache
+    ttl = app.config.setdefault('USER_CACHE_TTL', 30)
+    size = app.config.setdefault('USER_CACHE_SIZE', 1024)
+    _cache = LRUCache(maxsize=size, ttl=ttl)
+
+
+def load_principal(user_id):
+    """The Principal for ``user_id`` from the cache, else from one primary-key lookup"""
+    # The session's revision moves on when this visitor changes their own
+    # account, so their next request misses in every worker, not just this one
+    revision = session.get(REVISION_KEY)
+    entry = _cache.get(f'user:{user_id}')
+    if entry is not None and entry[0] == revision:
+        return entry[1]
+    user = db.session.get(User, user_id)
+    if user is None:
+        return None
+    principal = Principal(**{field: getattr(user, field) for field in Principal.FIELDS})
+    _cache.set(f'user:{user_id}', (revision, principal))
+    return principal
+
+
+def invalidate_user(user_id):
+    """Drop the cached Principal after the user's row changed (call once committed)"""
+    _cache.delete(f'user:{user_id}')
+    session[REVISION_KEY] = secrets.token_hex(4)
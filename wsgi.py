@@ -1,16 +1,15 @@
 """
 WSGI config for Havencraft project.
 It exposes the WSGI callable as a module-level variable named ``application``.
+
+The database is not touched here: the schema is created or migrated once per
+deploy by ``flask --app app init-db`` (see the release entry in the Procfile),
+so gunicorn workers boot without any schema work.
 """
 import os
-from HandmadeMart.app import create_app
-
-# Create the Flask application
-app = create_app()
+from app import app
 
-# Initialize database tables if they don't exist
-with app.app_context():
-    db.create_all()
+application = app
 
 if __name__ == "__main__":
     port = int(os.environ.get("PORT", 5000))